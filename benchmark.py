@@ -0,0 +1,228 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from candidate_store import binary_path, open_candidate_lines, read_candidate_lines_text, write_candidate_lines
+from encoder import Encoder, encodeRefinement
+
+# Repeatable timings of the encoding, I/O and solver phases on the committed sample data (the template 39 candidate
+# lines and encoding.cnf), so a slower hot loop shows up before it reaches a sweep. Every phase runs in a fresh
+# interpreter so its peak RSS is its own, and is repeated to take the best wall time. Results are written as JSON and
+# compared against a saved baseline, both in scratch/ by default. Without kissat next to the repository a stub solver
+# (this script with --stub-solver) stands in, it only parses the formula, so the solver phases then measure process and
+# pipe overhead.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+
+candidate_lines_2_path = os.path.join(script_dir, "2-candidate_lines", "39-candidate_lines.txt")
+candidate_lines_3_path = os.path.join(script_dir, "3-candidate_lines", "39-candidate_lines.txt")
+sample_cnf_path = os.path.join(script_dir, "encoding.cnf")
+satsolver_path = os.path.join(parent_dir, "kissat-rel-4.0.2", "build", "kissat")
+
+scratch_dir = os.path.join(script_dir, "scratch") # shared with the sweep's per-job files, not tracked
+output_path = os.path.join(scratch_dir, "benchmark.json")
+baseline_path = os.path.join(scratch_dir, "benchmark-baseline.json")
+
+PHASES = ["load_text", "pack", "load_binary", "encode_flat", "encode_compress", "encode_pipe", "read_cnf", "solve"]
+METRICS = ["variables", "clauses", "bytes_written", "lines"] # deterministic counts, any change means the encoding changed
+TIME_FLOOR = 0.05 # seconds, differences below this are noise whatever the ratio
+
+def stub_solver(arguments): # parses a DIMACS formula from the .cnf argument or stdin and reports nothing, like a solver giving up at once
+	cnf = next((argument for argument in arguments if argument.endswith(".cnf")), None)
+	f = open(cnf, "r") if cnf is not None else sys.stdin
+	clauses = 0
+	for line in f:
+		if line[:1] not in ["c", "p", "x", ""]:
+			clauses += line.count(" 0")
+	print(f"c stub solver parsed {clauses} clauses")
+	print("c Number of solutions: 0")
+	print("s UNKNOWN")
+
+def solver_commands(use_stub):
+	if use_stub:
+		return [sys.executable, os.path.abspath(__file__), "--stub-solver"]
+	return [satsolver_path]
+
+def load_fixture(limit): # the first limit relational and non-relational lines of each class, all of them for None
+	A_lines = open_candidate_lines(candidate_lines_2_path).lines()
+	B_lines = open_candidate_lines(candidate_lines_3_path).lines()
+	if limit is not None:
+		A_lines, B_lines = A_lines[:limit], B_lines[:limit]
+	return A_lines, B_lines
+
+def phase_load_text(work_dir, limit, use_stub):
+	count = 0
+	for path in [candidate_lines_2_path, candidate_lines_3_path]:
+		relational, non_relational = read_candidate_lines_text(path)
+		count += len(relational) + len(non_relational)
+	return {"lines": count}
+
+def phase_pack(work_dir, limit, use_stub):
+	count, size = 0, 0
+	for p, path in enumerate([candidate_lines_2_path, candidate_lines_3_path]):
+		relational, non_relational = read_candidate_lines_text(path)
+		packed_path = os.path.join(work_dir, f"{p + 2}-candidate_lines.bin")
+		write_candidate_lines(packed_path, relational, non_relational)
+		count += len(relational) + len(non_relational)
+		size += os.path.getsize(packed_path)
+	return {"lines": count, "bytes_written": size}
+
+def phase_load_binary(work_dir, limit, use_stub): # pack outside the timer, then time the memory-mapped load
+	paths = []
+	for p, path in enumerate([candidate_lines_2_path, candidate_lines_3_path]):
+		text_path = os.path.join(work_dir, f"{p + 2}-candidate_lines.txt")
+		write_candidate_lines(binary_path(text_path), *read_candidate_lines_text(path))
+		paths.append(text_path)
+	start = time.time()
+	count = sum(len(open_candidate_lines(path).lines()) for path in paths)
+	return {"lines": count, "wall_time": time.time() - start}
+
+def encode(work_dir, limit, compress):
+	A_lines, B_lines = load_fixture(limit)
+	start = time.time()
+	encoder = Encoder(os.path.join(work_dir, "encoding.cnf"))
+	encodeRefinement(encoder, A_lines, B_lines, compress=compress, verbose=False)
+	encoder.close()
+	return {"variables": encoder.variableCount, "clauses": encoder.clauseCount, "bytes_written": encoder.sink.bytes_written, "lines": len(A_lines) + len(B_lines), "wall_time": time.time() - start}
+
+def phase_encode_flat(work_dir, limit, use_stub):
+	return encode(work_dir, limit, False)
+
+def phase_encode_compress(work_dir, limit, use_stub): # every line, the compressed encoding stays small enough
+	return encode(work_dir, None, True)
+
+def phase_encode_pipe(work_dir, limit, use_stub): # the flat encoding streamed into the stub solver, always the stub since only the transfer is measured
+	A_lines, B_lines = load_fixture(limit)
+	start = time.time()
+	with open(os.path.join(work_dir, "lines.txt"), "w") as out_file:
+		solver = subprocess.Popen(solver_commands(True), stdin=subprocess.PIPE, stdout=out_file, stderr=subprocess.STDOUT, text=True, bufsize=1 << 20)
+		encoder = Encoder(None, stream=solver.stdin)
+		encodeRefinement(encoder, A_lines, B_lines, verbose=False)
+		encoder.close()
+		solver.wait()
+	return {"variables": encoder.variableCount, "clauses": encoder.clauseCount, "bytes_written": encoder.sink.bytes_written, "lines": len(A_lines) + len(B_lines), "wall_time": time.time() - start}
+
+def phase_read_cnf(work_dir, limit, use_stub):
+	variables, clauses = 0, 0
+	with open(sample_cnf_path, "r") as f:
+		for line in f:
+			if line.startswith("p cnf"):
+				variables = int(line.split()[2])
+			elif line[:1] not in ["c", ""]:
+				clauses += 1
+	return {"variables": variables, "clauses": clauses, "bytes_written": 0}
+
+def phase_solve(work_dir, limit, use_stub):
+	with open(os.path.join(work_dir, "lines.txt"), "w") as out_file:
+		commands = solver_commands(use_stub) + [sample_cnf_path]
+		subprocess.run(commands, stdout=out_file, stderr=subprocess.STDOUT)
+	return {}
+
+def run_phase(name, limit, use_stub): # in the child interpreter, prints one JSON record
+	with tempfile.TemporaryDirectory() as work_dir:
+		start = time.time()
+		record = globals()["phase_" + name](work_dir, limit, use_stub)
+		record.setdefault("wall_time", time.time() - start)
+	usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+	record["peak_rss_kb"] = usage # kilobytes on Linux
+	print(json.dumps(record))
+
+def measure(name, limit, use_stub, repeat): # best wall time and largest peak RSS over repeat fresh interpreters
+	arguments = [sys.executable, os.path.abspath(__file__), f"--run-phase={name}", f"--lines={limit if limit is not None else 'all'}"] + (["--stub"] if use_stub else [])
+	runs = []
+	for _ in range(repeat):
+		result = subprocess.run(arguments, capture_output=True, text=True)
+		if result.returncode != 0:
+			raise RuntimeError(f"Phase {name} failed:\n{result.stderr}")
+		runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+	record = {metric: runs[0][metric] for metric in METRICS if metric in runs[0]}
+	record["wall_time"] = min(run["wall_time"] for run in runs)
+	record["wall_times"] = [run["wall_time"] for run in runs]
+	record["peak_rss_kb"] = max(run["peak_rss_kb"] for run in runs)
+	return record
+
+def git_revision():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=script_dir, capture_output=True, text=True).stdout.strip() or None
+	except OSError:
+		return None
+
+def compare(results, baseline, tolerance): # list of regression messages, slower/larger beyond tolerance or changed counts
+	regressions = []
+	for name, record in results["phases"].items():
+		if name not in baseline.get("phases", {}):
+			continue
+		base = baseline["phases"][name]
+		if record["wall_time"] > base["wall_time"] * (1 + tolerance) and record["wall_time"] - base["wall_time"] > TIME_FLOOR:
+			regressions.append(f"{name}: wall time {base['wall_time']:.3f}s -> {record['wall_time']:.3f}s")
+		if record["peak_rss_kb"] > base["peak_rss_kb"] * (1 + tolerance):
+			regressions.append(f"{name}: peak RSS {base['peak_rss_kb']} KB -> {record['peak_rss_kb']} KB")
+		for metric in METRICS:
+			if metric in base and record.get(metric) != base[metric]:
+				regressions.append(f"{name}: {metric} {base[metric]} -> {record.get(metric)}")
+	if results["limit"] != baseline.get("limit") or results["solver"] != baseline.get("solver"):
+		regressions.append(f"baseline was taken with --lines={baseline.get('limit')} and the {baseline.get('solver')} solver, timings are not comparable")
+	return regressions
+
+if __name__ == "__main__":
+	arguments = sys.argv[1:]
+	if "--stub-solver" in arguments:
+		stub_solver(arguments)
+		sys.exit(0)
+	if "--help" in arguments or "-h" in arguments:
+		print("Usage: python3 benchmark.py [--phases=load_text,pack,...] [--lines=<limit>|all] [--repeat=<n>] [--stub] [--output=<json>] [--baseline=<json>] [--save-baseline] [--tolerance=<fraction>]\n")
+		print("Phases:", ", ".join(PHASES))
+		sys.exit(0)
+	options = {argument.split("=", 1)[0]: argument.split("=", 1)[1] for argument in arguments if "=" in argument}
+	limit = options.get("--lines", "2000") # the flat encoding is quadratic in the line count, all 14468 lines take minutes
+	limit = None if limit == "all" else int(limit)
+	use_stub = "--stub" in arguments or not os.path.exists(satsolver_path)
+
+	if "--run-phase" in options:
+		run_phase(options["--run-phase"], limit, use_stub)
+		sys.exit(0)
+
+	phases = options["--phases"].split(",") if "--phases" in options else PHASES
+	for name in phases:
+		if name not in PHASES:
+			print(f"Unknown phase {name}, expected one of {', '.join(PHASES)}")
+			sys.exit(1)
+	repeat = int(options.get("--repeat", 3))
+	output_path = options.get("--output", output_path)
+	baseline_path = options.get("--baseline", baseline_path)
+	tolerance = float(options.get("--tolerance", 0.2))
+
+	results = {"revision": git_revision(), "python": platform.python_version(), "machine": platform.machine(), "limit": limit, "solver": "stub" if use_stub else "kissat", "repeat": repeat, "phases": {}}
+	print(f"Benchmarking {len(phases)} phases, {repeat} runs each, {'all' if limit is None else limit} lines per class for the flat encoding, {results['solver']} solver")
+	for name in phases:
+		record = measure(name, limit, use_stub, repeat)
+		results["phases"][name] = record
+		counts = ", ".join(f"{metric} {record[metric]}" for metric in METRICS if metric in record)
+		print(f"     {name}: {round(record['wall_time'] * 1000) / 1000} seconds, {record['peak_rss_kb']} KB peak RSS" + (f", {counts}" if counts else ""))
+
+	os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+	with open(output_path, "w") as f:
+		json.dump(results, f, indent=2)
+	print("Wrote results to:", output_path)
+
+	if "--save-baseline" in arguments:
+		os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+		with open(baseline_path, "w") as f:
+			json.dump(results, f, indent=2)
+		print("Saved baseline to:", baseline_path)
+	elif os.path.exists(baseline_path):
+		with open(baseline_path, "r") as f:
+			baseline = json.load(f)
+		regressions = compare(results, baseline, tolerance)
+		print(f"\nCompared against baseline {baseline_path} (revision {baseline.get('revision')}):")
+		if regressions:
+			for message in regressions:
+				print("     REGRESSION", message)
+			sys.exit(1)
+		print("     no regressions")
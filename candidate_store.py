@@ -0,0 +1,189 @@
+import mmap
+import os
+import struct
+import sys
+
+from symmetry import lineOrbit
+
+# Binary candidate-line files. A candidate line meets every row of the square exactly once, so it is stored as the
+# column of its point in each row, one byte per row (10 bytes per line), after a header holding the relational and
+# non-relational line counts. Relational lines come first, so the R/N partition is just the relational count.
+# Readers memory-map the file and turn line i into its points (point = row * order + column + 1) on demand, which
+# replaces reading "R 1 12 ..." text lines into lists of strings and sets of point strings.
+# For a symmetric template an orbit file (.orbits) stores only one line per orbit of the point permutations in
+# symmetry.lineSymmetries, plus those generators (the image of every point, one byte each), and expands the orbits
+# lazily, so the file and the enumeration behind it shrink by about the order of the group.
+
+LINES_MAGIC = b"CANDLINE"
+LINES_VERSION = 1
+HEADER_FORMAT = "<8sIIQQ" # magic, version, order, relational line count, non-relational line count
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+ORBITS_MAGIC = b"CANDORBT"
+ORBITS_VERSION = 1
+ORBITS_HEADER_FORMAT = "<8sIIIQQQQ" # magic, version, order, generator count, relational and non-relational representative counts, relational and non-relational line counts
+ORBITS_HEADER_SIZE = struct.calcsize(ORBITS_HEADER_FORMAT)
+
+def binary_path(text_path): # 3-candidate_lines/<id>-candidate_lines.txt -> 3-candidate_lines/<id>-candidate_lines.bin
+	return os.path.splitext(text_path)[0] + ".bin"
+
+def orbit_path(text_path): # 3-candidate_lines/<id>-candidate_lines.txt -> 3-candidate_lines/<id>-candidate_lines.orbits
+	return os.path.splitext(text_path)[0] + ".orbits"
+
+def pack_line(points, order=10): # points of one line -> the column hit in each row
+	record = bytearray(order)
+	rows = 0
+	for p in points:
+		r, c = divmod(int(p) - 1, order)
+		record[r] = c
+		rows |= 1 << r
+	if rows != (1 << order) - 1 or len(points) != order:
+		raise ValueError(f"{' '.join(map(str, points))} does not meet every row exactly once.")
+	return bytes(record)
+
+def pack_candidate_lines(relational, non_relational, order=10): # whole file contents as bytes
+	header = struct.pack(HEADER_FORMAT, LINES_MAGIC, LINES_VERSION, order, len(relational), len(non_relational))
+	return header + b"".join(pack_line(line, order) for line in relational) + b"".join(pack_line(line, order) for line in non_relational)
+
+def read_candidate_lines_text(path): # (relational, non_relational) point lists of a "R ..."/"N ..." text file
+	lines = {"R": [], "N": []}
+	with open(path, "r") as f:
+		for line in f:
+			if line[:1] in lines:
+				lines[line[:1]].append([int(p) for p in line[2:].split() if int(p) > 0])
+	return lines["R"], lines["N"]
+
+def pack_orbit_lines(generators, relational, non_relational, order=10): # generators are point images (index 0 unused), the lines one representative per orbit
+	line_counts = [sum(len(lineOrbit(line, generators)) for line in lines) for lines in [relational, non_relational]]
+	header = struct.pack(ORBITS_HEADER_FORMAT, ORBITS_MAGIC, ORBITS_VERSION, order, len(generators), len(relational), len(non_relational), *line_counts)
+	packed_generators = b"".join(bytes(images[p] - 1 for p in range(1, order * order + 1)) for images in generators)
+	return header + packed_generators + b"".join(pack_line(line, order) for line in relational) + b"".join(pack_line(line, order) for line in non_relational)
+
+def write_file_atomically(path, contents): # written to a temporary file first, like sweep_ledger.write_atomically
+	temp_path = path + ".tmp"
+	with open(temp_path, "wb") as f:
+		f.write(contents)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(temp_path, path)
+
+def write_candidate_lines(path, relational, non_relational, order=10):
+	write_file_atomically(path, pack_candidate_lines(relational, non_relational, order))
+
+def write_orbit_lines(path, generators, relational, non_relational, order=10):
+	write_file_atomically(path, pack_orbit_lines(generators, relational, non_relational, order))
+
+class CandidateLines: # lines 0 .. relational_count-1 are relational, the rest non-relational
+	def __init__(self, buffer, path=None):
+		self.path = path
+		self.buffer = buffer
+		magic, version, self.order, self.relational_count, self.non_relational_count = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+		if magic != LINES_MAGIC or version != LINES_VERSION:
+			raise ValueError(f"{path} is not a version {LINES_VERSION} candidate-line file.")
+		self.row_offsets = [r * self.order + 1 for r in range(self.order)]
+
+	def __len__(self):
+		return self.relational_count + self.non_relational_count
+
+	def line(self, i): # points of line i in increasing order, negative i counts from the end like a list
+		index = i + len(self) if i < 0 else i
+		if index < 0 or index >= len(self): # the buffer would otherwise decode whatever bytes sit at that offset
+			raise IndexError(f"Candidate line {i} is out of range, {self.path} holds {len(self)} lines.")
+		start = HEADER_SIZE + index * self.order
+		return [offset + c for offset, c in zip(self.row_offsets, self.buffer[start : start + self.order])]
+
+	def lines(self):
+		return [self.line(i) for i in range(len(self))]
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self.line(i)
+
+	def is_relational(self, i):
+		return i < self.relational_count
+
+	def close(self):
+		if isinstance(self.buffer, mmap.mmap):
+			self.buffer.close()
+
+class OrbitCandidateLines: # the same interface as CandidateLines over the expanded lines, relational orbits first
+	def __init__(self, buffer, path=None):
+		self.path = path
+		self.buffer = buffer
+		magic, version, self.order, generator_count, self.relational_orbits, self.non_relational_orbits, self.relational_count, self.non_relational_count = struct.unpack_from(ORBITS_HEADER_FORMAT, buffer, 0)
+		if magic != ORBITS_MAGIC or version != ORBITS_VERSION:
+			raise ValueError(f"{path} is not a version {ORBITS_VERSION} candidate-line orbit file.")
+		points = self.order * self.order
+		self.generators = []
+		for g in range(generator_count):
+			start = ORBITS_HEADER_SIZE + g * points
+			self.generators.append([0] + [image + 1 for image in buffer[start : start + points]])
+		self.lines_offset = ORBITS_HEADER_SIZE + generator_count * points
+		self.row_offsets = [r * self.order + 1 for r in range(self.order)]
+		self.expanded = None
+
+	def __len__(self):
+		return self.relational_count + self.non_relational_count
+
+	def orbit_count(self):
+		return self.relational_orbits + self.non_relational_orbits
+
+	def representative(self, k): # points of the k-th stored line in increasing order
+		if k < 0 or k >= self.orbit_count():
+			raise IndexError(f"Orbit {k} is out of range, {self.path} holds {self.orbit_count()} orbits.")
+		start = self.lines_offset + k * self.order
+		return [offset + c for offset, c in zip(self.row_offsets, self.buffer[start : start + self.order])]
+
+	def __iter__(self): # expands one orbit at a time, nothing is kept
+		for k in range(self.orbit_count()):
+			for line in lineOrbit(self.representative(k), self.generators):
+				yield list(line)
+
+	def lines(self):
+		if self.expanded is None:
+			self.expanded = list(self)
+		return self.expanded
+
+	def line(self, i):
+		return self.lines()[i]
+
+	def is_relational(self, i):
+		return i < self.relational_count
+
+	def close(self):
+		if isinstance(self.buffer, mmap.mmap):
+			self.buffer.close()
+
+def load_candidate_lines(buffer, path=None): # CandidateLines or OrbitCandidateLines, whichever the magic names
+	if buffer[:len(ORBITS_MAGIC)] == ORBITS_MAGIC:
+		return OrbitCandidateLines(buffer, path)
+	return CandidateLines(buffer, path)
+
+def open_candidate_lines(text_path): # memory-maps the .bin or .orbits file next to text_path, or packs the text file in memory when there is neither or it is older than the text
+	for path in [binary_path(text_path), orbit_path(text_path)]:
+		if not os.path.exists(path):
+			continue
+		if os.path.exists(text_path) and os.path.getmtime(path) < os.path.getmtime(text_path): # the text was regenerated or edited since
+			rerun = f"python3 candidate_store.py pack {text_path}" if path == binary_path(text_path) else "the sweep with --orbits"
+			print(f"{path} is older than {text_path}, reading the text file instead (rerun {rerun} to refresh it).")
+			continue
+		with open(path, "rb") as f:
+			return load_candidate_lines(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+	relational, non_relational = read_candidate_lines_text(text_path)
+	return CandidateLines(pack_candidate_lines(relational, non_relational), text_path)
+
+if __name__ == "__main__":
+	if len(sys.argv) < 3 or sys.argv[1] not in ["pack", "export"]:
+		print("Usage: python3 candidate_store.py pack <candidate_lines.txt> ...   (writes the .bin file next to each text file)")
+		print("       python3 candidate_store.py export <candidate_lines.bin | candidate_lines.orbits>    (prints the lines in the text format, orbits expanded)\n")
+		sys.exit(1)
+	if sys.argv[1] == "pack":
+		for text_path in sys.argv[2:]:
+			relational, non_relational = read_candidate_lines_text(text_path)
+			write_candidate_lines(binary_path(text_path), relational, non_relational)
+			print(f"Packed {len(relational)} relational and {len(non_relational)} non-relational lines into {binary_path(text_path)}")
+	else:
+		with open(sys.argv[2], "rb") as f:
+			candidate_lines = load_candidate_lines(f.read(), sys.argv[2])
+		for i in range(len(candidate_lines)):
+			print(("R " if candidate_lines.is_relational(i) else "N ") + " ".join(map(str, candidate_lines.line(i))))
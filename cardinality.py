@@ -0,0 +1,220 @@
+import itertools
+import sys
+
+from clause_sink import CountingSink
+
+# Cardinality constraints "between minimum and maximum of variables are true" for any sink with newVariable/addClause
+# (ClauseSink, CountingSink). The sequential counter is the encoding every script used so far and stays the default;
+# the others trade auxiliary variables for clauses differently, and "auto" picks one from n, minimum and maximum.
+#   sequential  Sinz's sequential counter, (n+1)(k+1) auxiliary variables for k = maximum + 1
+#   totalizer   Bailleux and Boufkhad's totalizer, unary counts merged up a binary tree and cut off at k
+#   network     Batcher's odd-even merge sorting network, the sorted outputs are then fixed at minimum and maximum
+#   ladder      regular (ladder) encoding of at-most-one/exactly-one, n-1 auxiliary variables and about 4n clauses
+#   commander   Klieber and Kwon's commander encoding of at-most-one/exactly-one, groups of three
+#   pairwise    no auxiliary variables, one clause per subset of size maximum+1 and n-minimum+1, only for tiny sets
+# Every auxiliary variable except the sequential counter's is fully determined by the variables it counts, so the
+# encodings never add solutions to an exhaustive enumeration over the original variables.
+
+ENCODINGS = ["sequential", "totalizer", "network", "ladder", "commander", "pairwise"]
+AT_MOST_ONE_ENCODINGS = ["ladder", "commander"] # only for maximum <= 1
+
+def addCardinalityClauses(sink, variables, minimum, maximum, encoding="sequential"): # <= maximum variables and >= minimum values are true (latin squares would use minimum = maximum = 1 for each symbol)
+	if encoding == "auto":
+		encoding = chooseEncoding(len(variables), minimum, maximum)
+	if encoding == "sequential":
+		return sequentialCounter(sink, variables, minimum, maximum)
+	if encoding not in ENCODINGS:
+		raise ValueError(f"Unknown cardinality encoding {encoding!r}, expected one of {', '.join(ENCODINGS)} or auto.")
+	if encoding in AT_MOST_ONE_ENCODINGS and maximum > 1:
+		raise ValueError(f"The {encoding} encoding only handles at most one true variable, not {maximum}.")
+	n = len(variables)
+	if minimum > n or minimum > maximum: # unsatisfiable, like the sequential counter's conflicting unit clauses
+		x = sink.newVariable()
+		sink.addClause([x])
+		sink.addClause([-x])
+		return
+	if minimum <= 0 and maximum >= n: # nothing to enforce
+		return
+	if maximum == 0:
+		for x in variables:
+			sink.addClause([-x])
+		return
+	if minimum == n:
+		for x in variables:
+			sink.addClause([x])
+		return
+	if encoding == "totalizer":
+		totalizer(sink, variables, minimum, maximum)
+	elif encoding == "network":
+		sortingNetwork(sink, variables, minimum, maximum)
+	elif encoding == "ladder":
+		ladder(sink, variables, minimum)
+	elif encoding == "commander":
+		commander(sink, variables, minimum)
+	else:
+		pairwise(sink, variables, minimum, maximum)
+
+def sequentialCounter(sink, variables, mininum, maximum):
+	n = len(variables) # rows
+	k = maximum + 1	   # columns
+	l = mininum
+
+	s = [] # Boolean counter variables, s[i][j] says at least j of the variables x1, ..., xi are assigned to true
+	for i in range(n + 1):
+		row = []
+		for j in range(k + 1):
+			row.append(sink.newVariable())
+		s.append(row)
+
+	for i in range(n+1):
+		sink.addClause([s[i][0]]) # 0 variables are always true of variables [x1, ..., xi]
+	for j in range(1, k+1):
+		sink.addClause([-s[0][j]]) # j>=1 of nothing is always false
+	for j in range(1, l+1):
+		sink.addClause([s[n][j]]) # at least minimum of [x0, ..., xi-1] are true
+	for i in range(1, n+1):
+		sink.addClause([-s[i][k]]) # at most maximum of [x0, ..., xi-1] are true
+
+	for i in range(1, n+1): # for each variable xi, propagate counts across the table
+		for j in range(1, k+1):
+			sink.addImplicationClause([s[i-1][j]], [s[i][j]]) # If at least j of the first i-1 variables are true, then at least j of the first i variables are true
+			sink.addImplicationClause([variables[i-1], s[i-1][j-1]], [s[i][j]]) # If xi is true and at least j-1 of the first i-1 variables are true, then at least j of the first i variables are true
+			if j <= l:
+				sink.addImplicationClause([s[i][j]], [s[i-1][j], variables[i-1]]) # If at least j of the first i variables are true, then either xi is true or at least j of the first i-1 variables were already true
+				sink.addImplicationClause([s[i][j]], [s[i-1][j-1]]) # If at least j of the first i variables are true, then at least j-1 of the first i-1 variables must be true
+
+def totalizer(sink, variables, minimum, maximum):
+	cap = min(len(variables), max(maximum + 1, minimum)) # counts above maximum + 1 never matter
+	counts = _totalizerNode(sink, variables, cap) # counts[i] <=> at least i+1 of the variables are true
+	if minimum >= 1:
+		sink.addClause([counts[minimum - 1]])
+	if maximum < len(counts):
+		sink.addClause([-counts[maximum]])
+
+def _totalizerNode(sink, variables, cap): # unary count of variables, cut off at cap
+	if len(variables) == 1:
+		return list(variables)
+	half = len(variables) // 2
+	a = _totalizerNode(sink, variables[:half], cap)
+	b = _totalizerNode(sink, variables[half:], cap)
+	size = min(len(variables), cap)
+	counts = [sink.newVariable() for _ in range(size)]
+	for i in range(len(a) + 1):
+		for j in range(len(b) + 1):
+			if i + j >= 1: # at least i of a and j of b -> at least i+j
+				sink.addImplicationClause(([a[i - 1]] if i > 0 else []) + ([b[j - 1]] if j > 0 else []), [counts[min(i + j, size) - 1]])
+			if i + j < size: # at most i of a and j of b -> at most i+j
+				sink.addImplicationClause([counts[i + j]], ([a[i]] if i < len(a) else []) + ([b[j]] if j < len(b) else []))
+	return counts
+
+def sortingNetwork(sink, variables, minimum, maximum):
+	padded = list(variables)
+	if len(padded) & (len(padded) - 1): # odd-even merge needs a power of two, padded with false inputs
+		false = sink.newVariable()
+		sink.addClause([-false])
+		padded += [false] * ((1 << (len(padded) - 1).bit_length()) - len(padded))
+	sorted_outputs = _oddEvenSort(sink, padded) # true outputs first, sorted_outputs[i] <=> at least i+1 are true
+	if minimum >= 1:
+		sink.addClause([sorted_outputs[minimum - 1]])
+	if maximum < len(variables):
+		sink.addClause([-sorted_outputs[maximum]])
+
+def _oddEvenSort(sink, xs):
+	if len(xs) == 1:
+		return xs
+	half = len(xs) // 2
+	return _oddEvenMerge(sink, _oddEvenSort(sink, xs[:half]), _oddEvenSort(sink, xs[half:]))
+
+def _oddEvenMerge(sink, a, b): # merges two sorted sequences of the same power-of-two length
+	if len(a) == 1:
+		return list(_comparator(sink, a[0], b[0]))
+	v = _oddEvenMerge(sink, a[0::2], b[0::2])
+	w = _oddEvenMerge(sink, a[1::2], b[1::2])
+	merged = [v[0]]
+	for i in range(len(v) - 1):
+		merged.extend(_comparator(sink, v[i + 1], w[i]))
+	merged.append(w[-1])
+	return merged
+
+def _comparator(sink, a, b): # (a OR b, a AND b)
+	high = sink.newVariable()
+	low = sink.newVariable()
+	sink.addImplicationClause([a], [high])
+	sink.addImplicationClause([b], [high])
+	sink.addImplicationClause([high], [a, b])
+	sink.addImplicationClause([low], [a])
+	sink.addImplicationClause([low], [b])
+	sink.addImplicationClause([a, b], [low])
+	return high, low
+
+def ladder(sink, variables, minimum): # at most one, and at least one when minimum is 1
+	n = len(variables)
+	y = [sink.newVariable() for _ in range(n - 1)] # y[i] <=> one of x1, ..., x(i+1) is true
+	for i in range(n - 1):
+		sink.addImplicationClause([variables[i]], [y[i]])
+		if i > 0:
+			sink.addImplicationClause([y[i - 1]], [y[i]])
+			sink.addImplicationClause([y[i]], [y[i - 1], variables[i]])
+		else:
+			sink.addImplicationClause([y[i]], [variables[i]])
+	for i in range(1, n):
+		sink.addImplicationClause([y[i - 1]], [-variables[i]]) # nothing after the first true variable
+	if minimum >= 1:
+		sink.addClause(list(variables))
+
+def commander(sink, variables, minimum, group=3): # at most one, and at least one when minimum is 1
+	if len(variables) <= group + 1:
+		pairwise(sink, variables, minimum, 1)
+		return
+	commanders = []
+	for start in range(0, len(variables), group):
+		members = variables[start:start + group]
+		c = sink.newVariable() # c <=> one of the group is true
+		for x in members:
+			sink.addImplicationClause([x], [c])
+		sink.addImplicationClause([c], members)
+		pairwise(sink, members, 0, 1)
+		commanders.append(c)
+	commander(sink, commanders, minimum, group)
+
+def pairwise(sink, variables, minimum, maximum):
+	if maximum < len(variables):
+		for subset in itertools.combinations(variables, maximum + 1):
+			sink.addClause([-x for x in subset])
+	if minimum >= 1:
+		for subset in itertools.combinations(variables, len(variables) - minimum + 1):
+			sink.addClause(list(subset))
+
+_chosen = {}
+
+def chooseEncoding(n, minimum, maximum): # the encoding giving the smallest formula for these sizes
+	if minimum > maximum or minimum > n or maximum == 0 or minimum == n:
+		return "pairwise" # trivial cases, handled without any encoding
+	key = (n, minimum, maximum)
+	if key not in _chosen:
+		if maximum <= 1:
+			candidates = ["ladder", "commander"] + (["pairwise"] if n <= 6 else [])
+		else:
+			candidates = ["sequential", "totalizer", "network"] + (["pairwise"] if n <= 8 else [])
+		sizes = {encoding: encodingSize(n, minimum, maximum, encoding) for encoding in candidates}
+		_chosen[key] = min(candidates, key=lambda encoding: sizes[encoding][0] + sizes[encoding][1])
+	return _chosen[key]
+
+def encodingSize(n, minimum, maximum, encoding): # (auxiliary variables, clauses) of one constraint, from a dry run
+	sink = CountingSink(variableCount=n)
+	addCardinalityClauses(sink, list(range(1, n + 1)), minimum, maximum, encoding)
+	return sink.variableCount - n, sink.clauseCount
+
+if __name__ == "__main__":
+	if len(sys.argv) < 4:
+		print("Usage: python3 cardinality.py <n> <minimum> <maximum>   (variable and clause counts of each encoding)\n")
+		sys.exit(1)
+	n, minimum, maximum = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+	print(f"Between {minimum} and {maximum} of {n} variables, auto picks {chooseEncoding(n, minimum, maximum)}:")
+	for encoding in ENCODINGS:
+		if encoding in AT_MOST_ONE_ENCODINGS and maximum > 1:
+			continue
+		if encoding == "pairwise" and n > 20:
+			continue
+		variables, clauses = encodingSize(n, minimum, maximum, encoding)
+		print(f"     {encoding}: {variables} variables, {clauses} clauses")
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+# Persistent index of the nauty certificates seen by template_verification.py. Certificates are hashed to a fixed-size
+# digest and looked up in a dict (digest -> template id) instead of scanning a list, and both the digests and the input
+# files already processed are stored on disk so a later run only canonicalizes new solution sets.
+# Every template also keeps a cheap isomorphism invariant (see template_verification.template_invariant). A template
+# whose invariant was never seen cannot be isomorphic to a known one, so it is stored without a certificate, and its
+# certificate is only computed once a second template lands in the same invariant bucket.
+
+class CertificateIndex:
+	def __init__(self, path):
+		self.path = path
+		self.connection = sqlite3.connect(path)
+		columns = [row[1] for row in self.connection.execute("PRAGMA table_info(certificates)")]
+		if len(columns) > 0 and "invariant" not in columns: # written before the invariant buckets, the digest may now be missing
+			self.connection.executescript("""ALTER TABLE certificates RENAME TO certificates_old;
+				CREATE TABLE certificates (id INTEGER PRIMARY KEY, digest BLOB UNIQUE, invariant BLOB);
+				INSERT INTO certificates (id, digest) SELECT id, digest FROM certificates_old;
+				DROP TABLE certificates_old;""")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS certificates (id INTEGER PRIMARY KEY, digest BLOB UNIQUE, invariant BLOB)")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, templates INTEGER, finished_at REAL)")
+		self.connection.commit()
+		self.ids = {} # digest -> template id
+		self.invariants = set() # invariants of every known template
+		self.undigested = {} # invariant -> id of the one template in that bucket that was never canonicalized
+		self.missing = [] # ids stored before invariants were kept, see fill_invariants
+		self.count = 0
+		for id, digest, invariant in self.connection.execute("SELECT id, digest, invariant FROM certificates"):
+			self.count += 1
+			if digest is not None:
+				self.ids[digest] = id
+			if invariant is None:
+				self.missing.append(id)
+			else:
+				self.invariants.add(invariant)
+				if digest is None:
+					self.undigested[invariant] = id
+		self.pending = []
+		self.pending_updates = []
+
+	def __len__(self):
+		return self.count
+
+	@staticmethod
+	def digest(cert):
+		return hashlib.sha256(cert).digest()
+
+	def lookup(self, cert): # template id of an isomorphic template seen before, or None
+		return self.ids.get(self.digest(cert))
+
+	def add(self, cert): # new template id (1, 2, ... in first-seen order) or None if the certificate is already known
+		return self.add_digest(self.digest(cert))
+
+	def add_digest(self, digest, invariant=None): # same as add() for a certificate that was already hashed, e.g. by a worker process
+		if digest in self.ids:
+			return None
+		id = self._insert(digest, invariant)
+		self.ids[digest] = id
+		return id
+
+	def add_undigested(self, invariant): # new template id for a template whose invariant bucket was empty, no certificate needed
+		if invariant in self.invariants:
+			raise ValueError("A template with this invariant is already known, it has to be canonicalized.")
+		id = self._insert(None, invariant)
+		self.undigested[invariant] = id
+		return id
+
+	def _insert(self, digest, invariant):
+		self.count += 1
+		if invariant is not None:
+			self.invariants.add(invariant)
+		self.pending.append((self.count, digest, invariant))
+		if len(self.pending) >= 1000:
+			self.commit()
+		return self.count
+
+	def set_digest(self, invariant, digest): # the deferred certificate of the bucket's first template, returns its id
+		id = self.undigested.pop(invariant)
+		self.ids[digest] = id
+		self.pending_updates.append((digest, None, id))
+		return id
+
+	def fill_invariants(self, invariant_of): # invariant_of(id) for every template stored before invariants were kept, returns how many were filled in
+		for id in self.missing:
+			invariant = invariant_of(id)
+			self.invariants.add(invariant)
+			self.pending_updates.append((None, invariant, id))
+		filled = len(self.missing)
+		self.missing = []
+		self.commit()
+		return filled
+
+	def has_invariant(self, invariant): # whether some known template might be isomorphic to one with this invariant
+		return invariant in self.invariants
+
+	def undigested_id(self, invariant): # id of the bucket's template that still has no certificate, or None
+		return self.undigested.get(invariant)
+
+	def commit(self):
+		self.connection.executemany("INSERT INTO certificates (id, digest, invariant) VALUES (?, ?, ?)", self.pending)
+		self.connection.executemany("UPDATE certificates SET digest = coalesce(?, digest), invariant = coalesce(?, invariant) WHERE id = ?", self.pending_updates)
+		self.connection.commit()
+		self.pending.clear()
+		self.pending_updates.clear()
+
+	def has_source(self, path): # whether this exact input file was already fully processed
+		row = self.connection.execute("SELECT size, mtime FROM sources WHERE path = ?", [os.path.abspath(path)]).fetchone()
+		stat = os.stat(path)
+		return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+	def finish_source(self, path, templates):
+		self.commit()
+		stat = os.stat(path)
+		self.connection.execute("INSERT OR REPLACE INTO sources (path, size, mtime, templates, finished_at) VALUES (?, ?, ?, ?, ?)",
+			[os.path.abspath(path), stat.st_size, stat.st_mtime, templates, time.time()])
+		self.connection.commit()
+
+	def close(self):
+		self.commit()
+		self.connection.close()
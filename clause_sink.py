@@ -0,0 +1,168 @@
+from array import array
+
+# Shared clause sink for every encoder script. Clauses are kept as literals in one flat array('i') where each clause is
+# terminated by 0 exactly like in DIMACS, so the terminators double as the clause offsets and a whole buffer becomes
+# DIMACS text with a single join. Buffers are written in large chunks through one open file handle and the sink keeps
+# its own variable and clause counts. Once the body is streamed the header is not known up front, so a fixed-width
+# region is reserved at the start of the file and patched with seek(0) on close instead of rewriting the body.
+# Given a stream the same text is fed straight to a running solver, and the file on disk becomes an optional copy.
+
+HEADER_WIDTH = 64 # "p cnf <vars> <clauses>" with two 20-digit counts still fits
+HEADER_PLACEHOLDER = "c" + " " * (HEADER_WIDTH - 2) + "\n"
+
+class ClauseSink:
+	def __init__(self, path, variableCount=0, buffer_limit=1 << 22, stream=None): # buffer_limit is in literals, None keeps everything in memory until close()
+		self.path = path # may be None when only streaming
+		self.stream = stream # e.g. a solver's stdin, receives the DIMACS text while it is being encoded
+		self.variableCount = variableCount
+		self.clauseCount = 0
+		self.literals = array('i')
+		self.xor_lines = [] # native "x" lines (CryptoMiniSat's extended DIMACS), written after the buffered clauses
+		self.buffer_limit = buffer_limit
+		self.file = None
+		self.opened = False
+		self.bytes_written = 0
+
+	def newVariable(self):
+		self.variableCount += 1
+		return self.variableCount
+
+	def addClause(self, variables):
+		if len(variables) == 0:
+			return False
+		self.literals.extend(variables)
+		self.literals.append(0)
+		self.clauseCount += 1
+		if self.buffer_limit is not None and len(self.literals) >= self.buffer_limit:
+			self.flush()
+		return True
+
+	def addImplicationClause(self, antecedent, consequent): # conjunction(AND) of all antecedental variables implies the disjunction(OR) of consequental variables
+		self.literals.extend([-x for x in antecedent]) # X implies Y is equivalent to -X OR Y
+		self.literals.extend(consequent)
+		self.literals.append(0)
+		self.clauseCount += 1
+		if self.buffer_limit is not None and len(self.literals) >= self.buffer_limit:
+			self.flush()
+		return True
+
+	def addBinaryClauses(self, literal, others): # one clause (literal OR o) for every o in others, e.g. the -a[i] -b[j] conflict clauses
+		k = len(others)
+		if k == 0:
+			return False
+		block = array('i', [literal, 0, 0]) * k
+		block[1::3] = array('i', others)
+		self.literals.extend(block)
+		self.clauseCount += k
+		if self.buffer_limit is not None and len(self.literals) >= self.buffer_limit:
+			self.flush()
+		return True
+
+	def addClauses(self, literals, clauseCount): # a whole block of 0-terminated clauses, e.g. one loaded from encoding_cache
+		self.literals.extend(literals)
+		self.clauseCount += clauseCount
+		if self.buffer_limit is not None and len(self.literals) >= self.buffer_limit:
+			self.flush()
+		return True
+
+	def addXORClause(self, literals): # native XOR "x l1 l2 ... 0", true when an odd number of the literals are true, only for solvers that parse it
+		if len(literals) == 0:
+			return False
+		self.xor_lines.append("x" + " ".join(map(str, literals)) + " 0\n")
+		self.clauseCount += 1 # CryptoMiniSat counts them with the clauses in the header
+		return True
+
+	def header(self):
+		return f"p cnf {self.variableCount} {self.clauseCount}\n"
+
+	def paddedHeader(self): # exact header followed by a blank comment line so it always fills HEADER_WIDTH bytes
+		header = self.header()
+		if len(header) + 2 > HEADER_WIDTH:
+			raise ValueError(f"DIMACS header {header.strip()!r} does not fit in the reserved {HEADER_WIDTH} bytes.")
+		return header + "c" + " " * (HEADER_WIDTH - len(header) - 2) + "\n"
+
+	def _open(self, header, stream_header):
+		self.opened = True
+		if self.path is not None:
+			self.file = open(self.path, "w")
+			self.file.write(header)
+		if self.stream is not None:
+			self.stream.write(stream_header)
+		self.bytes_written += len(header)
+
+	def _write(self, text):
+		if not self.opened: # the counts are unknown until close(), which patches the reserved region of the file in place
+			self._open(HEADER_PLACEHOLDER, self.header()) # a pipe cannot be patched, solvers reading it are started with their lenient header option (see solver.py)
+		if self.file is not None:
+			self.file.write(text)
+		if self.stream is not None:
+			self.stream.write(text)
+		self.bytes_written += len(text)
+
+	def flush(self):
+		if len(self.literals) == 0 and len(self.xor_lines) == 0:
+			return
+		text = " ".join(map(str, self.literals)).replace(" 0 ", " 0\n") + "\n" if len(self.literals) > 0 else "" # literals are never 0, so " 0 " only matches clause terminators
+		text += "".join(self.xor_lines)
+		self.literals = array('i')
+		self.xor_lines = []
+		self._write(text)
+
+	def close(self):
+		if not self.opened: # nothing flushed yet, so the exact header can simply go first
+			self._open(self.header(), self.header())
+			self.flush()
+		else:
+			self.flush()
+			if self.file is not None:
+				self.file.seek(0)
+				self.file.write(self.paddedHeader())
+		if self.file is not None:
+			self.file.close()
+		if self.stream is not None:
+			self.stream.close() # end of input for the solver
+
+def splitClauses(literals): # the clauses of a 0-terminated literal buffer as lists of literals
+	clauses = []
+	clause = []
+	for literal in literals:
+		if literal == 0:
+			clauses.append(clause)
+			clause = []
+		else:
+			clause.append(literal)
+	return clauses
+
+class CountingSink: # dry run with the ClauseSink interface, only counts variables and clauses (e.g. to compare encodings)
+	def __init__(self, variableCount=0):
+		self.variableCount = variableCount
+		self.clauseCount = 0
+		self.literalCount = 0
+
+	def newVariable(self):
+		self.variableCount += 1
+		return self.variableCount
+
+	def addClause(self, variables):
+		if len(variables) == 0:
+			return False
+		self.clauseCount += 1
+		self.literalCount += len(variables)
+		return True
+
+	def addImplicationClause(self, antecedent, consequent):
+		self.clauseCount += 1
+		self.literalCount += len(antecedent) + len(consequent)
+		return True
+
+	def addBinaryClauses(self, literal, others):
+		self.clauseCount += len(others)
+		self.literalCount += 2 * len(others)
+		return len(others) > 0
+
+	def addXORClause(self, literals):
+		if len(literals) == 0:
+			return False
+		self.clauseCount += 1
+		self.literalCount += len(literals)
+		return True
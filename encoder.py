@@ -0,0 +1,187 @@
+import itertools
+
+import incidence
+from cardinality import addCardinalityClauses
+from clause_sink import ClauseSink
+from symmetry import addLexLeaderClauses
+
+# Shared encoding core for the scripts. An Encoder owns everything one formula needs, its variable allocator, its clause
+# sink and the encoding choices (e.g. the cardinality encoding), so nothing lives in module globals and several formulas
+# can be built side by side in one process or in threads. The scripts are thin command lines over the encodings below.
+# XOR constraints are either written as clauses, with chains longer than xor_cut split into pieces joined by auxiliary
+# parity variables so the clause count grows linearly instead of as 2^(n-1), or as native "x" lines for CryptoMiniSat.
+
+order = 10
+XOR_MODES = ["cnf", "native"]
+
+class Encoder:
+	def __init__(self, path=None, variableCount=0, buffer_limit=1 << 22, stream=None, cardinality="sequential", sink=None, xor="cnf", xor_cut=4): # sink replaces the ClauseSink built from path/stream, e.g. a CountingSink for a dry run
+		if xor not in XOR_MODES:
+			raise ValueError(f"Unknown XOR mode {xor!r}, expected one of {', '.join(XOR_MODES)}.")
+		if xor_cut < 3:
+			raise ValueError(f"XOR chains can only be cut into pieces of at least 3 variables, not {xor_cut}.")
+		self.sink = sink if sink is not None else ClauseSink(path, variableCount, buffer_limit, stream)
+		self.cardinality = cardinality
+		self.xor = xor
+		self.xor_cut = xor_cut # longest chain written as plain clauses, 2^(xor_cut - 1) clauses per piece
+
+	@property
+	def variableCount(self):
+		return self.sink.variableCount
+
+	@variableCount.setter
+	def variableCount(self, value):
+		self.sink.variableCount = value
+
+	@property
+	def clauseCount(self):
+		return self.sink.clauseCount
+
+	def newVariable(self):
+		return self.sink.newVariable()
+
+	def addClause(self, variables):
+		return self.sink.addClause(variables)
+
+	def addImplicationClause(self, antecedent, consequent): # conjunction(AND) of all antecedental variables implies the disjunction(OR) of consequental variables
+		return self.sink.addImplicationClause(antecedent, consequent)
+
+	def addBinaryClauses(self, literal, others):
+		return self.sink.addBinaryClauses(literal, others)
+
+	def addClauses(self, literals, clauseCount):
+		return self.sink.addClauses(literals, clauseCount)
+
+	def addCardinalityClauses(self, variables, minimum, maximum, encoding=None): # see cardinality.py, defaults to this encoder's choice
+		addCardinalityClauses(self.sink, variables, minimum, maximum, self.cardinality if encoding is None else encoding)
+
+	def addXORClauses(self, chain, odd=False): # the chain has an even number of true variables (odd=False, like the old 2^(len(chain) - 1) clause version) or an odd number
+		chain = list(chain)
+		if len(chain) == 0:
+			if odd: # unsatisfiable, like the cardinality encodings' conflicting unit clauses
+				x = self.newVariable()
+				self.addClause([x])
+				self.addClause([-x])
+			return
+		if self.xor == "native":
+			self.sink.addXORClause(chain if odd else [-chain[0]] + chain[1:]) # an "x" line asks for odd parity, negating one literal flips it
+			return
+		while len(chain) > self.xor_cut: # x1 ^ ... ^ xn = (x1 ^ ... ^ xk-1) ^ xk ^ ... ^ xn with t <=> x1 ^ ... ^ xk-1
+			t = self.newVariable()
+			self._parityClauses(chain[:self.xor_cut - 1] + [t], False)
+			chain = [t] + chain[self.xor_cut - 1:]
+		self._parityClauses(chain, odd)
+
+	def _parityClauses(self, chain, odd): # every assignment of the wrong parity is cut off by the clause negating exactly its true variables
+		for notCount in range(0 if odd else 1, len(chain) + 1, 2):
+			for negated in itertools.combinations(range(len(chain)), notCount):
+				clause = chain.copy()
+				for i in negated:
+					clause[i] = -clause[i]
+				self.addClause(clause)
+
+	def flush(self):
+		self.sink.flush()
+
+	def close(self):
+		self.sink.close()
+
+def get1DIndex(r, c): # cell variable of a candidate line, also the point number used in the candidate-line files
+	return r * order + c + 1
+
+def getTemplateBit(template, r, c, bit):
+	if (r < 0 or r >= order) or (c < 0 or c >= order) or (bit < 0 or bit >= order):
+		raise TypeError(f"Attempted to get bit at ({r},{c},{bit}), which is out of bounds, must be witin {0} and {order} for each position.")
+	return template[bit][r][c]
+
+def encodeCandidateLines(encoder, template, frequency_square, relational_lines, symmetries=()): # permutation matrices restricted to the (non-)relational cells of the frequency square, returns the exhaustive variable count
+	encoder.variableCount = get1DIndex(order-1, order-1)
+	exhaustive_variables = encoder.variableCount
+	for x in range(order): # Make sure variables form a row and column monomial matrix (Permutation matrix)
+		row_vars = [get1DIndex(x, c) for c in range(order)]
+		encoder.addCardinalityClauses(row_vars, 1, 1)
+		col_vars = [get1DIndex(r, x) for r in range(order)]
+		encoder.addCardinalityClauses(col_vars, 1, 1)
+
+	num_bits = len(template)
+	weight_buckets = {} # enforce weight 22 for relational and weight 12 for non-relational (with our desired weights for each point in the line)
+	for weight in range(num_bits + 1):
+		weight_buckets[weight] = []
+
+	for r in range(order): # only include relational or non-relation points
+		for c in range(order):
+			weight = sum(getTemplateBit(template, r, c, b) for b in range(num_bits))
+			if relational_lines == True:
+				if getTemplateBit(template, r, c, frequency_square) == 0:
+					encoder.addClause([-get1DIndex(r,c)])
+				else:
+					weight_buckets[weight].append(get1DIndex(r, c))
+			elif relational_lines == False:
+				if getTemplateBit(template, r, c, frequency_square) == 1:
+					encoder.addClause([-get1DIndex(r,c)])
+				else:
+					weight_buckets[weight].append(get1DIndex(r, c))
+
+	if relational_lines == True:
+		encoder.addCardinalityClauses(weight_buckets.get(4, []), 1, 1)  # exactly one weight-4
+		encoder.addCardinalityClauses(weight_buckets.get(2, []), 9, 9)  # exactly nine weight-2
+	elif relational_lines == False:
+		encoder.addCardinalityClauses(weight_buckets.get(2, []), 6, 6)  # exactly six weight-2
+		encoder.addCardinalityClauses(weight_buckets.get(0, []), 4, 4)  # exactly four weight-0
+
+	point_variables = list(range(1, exhaustive_variables + 1))
+	for images in symmetries: # point permutations from symmetry.lineSymmetries, only orbit representatives (and a few extra lines) are enumerated
+		addLexLeaderClauses(encoder, point_variables, [images[p] - 1 for p in point_variables])
+	return exhaustive_variables
+
+def encodeRefinement(encoder, A_lines, B_lines, compress=False, use_numpy=False, verbose=True, symmetries=()): # picks one parallel class from each list of candidate lines, meeting each other exactly once, returns the exhaustive variable count
+	if verbose:
+		print("Assinging variables to each candidate line.")
+	#	1 <= i <= candidate_line_count, needs to immutable object so it doesnt reference same value for all entries of array
+	a = [encoder.newVariable() for _ in range(len(A_lines))] # a[i] = true <=> candidate i selected for A
+	b = [encoder.newVariable() for _ in range(len(B_lines))] # b[i] = true <=> candidate i selected for B
+	exhaustive_variables = encoder.variableCount
+	# variable count is now 2 * candidate_line_count
+
+	point_to_A = {}
+	point_to_B = {}
+	for i, line in enumerate(A_lines):
+		for p in line:
+			point_to_A.setdefault(p, []).append(i)
+	for j, line in enumerate(B_lines):
+		for p in line:
+			point_to_B.setdefault(p, []).append(j)
+	total_points = sorted(point_to_A.keys() | point_to_B.keys()) # points in A or B
+
+	if verbose:
+		print("Enforcing coverage of each point by exactly one line.")
+	for p in total_points: # at least 1 line for each point must be selected, ~2,315,680 clauses
+		a_indices = point_to_A.get(p, [])
+		b_indices = point_to_B.get(p, [])
+		if a_indices:
+			encoder.addCardinalityClauses([a[i] for i in a_indices], 1, 1)
+		if b_indices:
+			encoder.addCardinalityClauses([b[j] for j in b_indices], 1, 1)
+
+	if verbose:
+		print("Enforcing exactly one intersection for each line in one parallel class to the other.")
+	if compress: # 45 * (|A| + |B|) + 4950 clauses at most, instead of up to |A| * |B|
+		for X, Y in incidence.pointPairBicliques(A_lines, B_lines):
+			z = encoder.newVariable() # z <=> some selected A line goes through this pair of points
+			encoder.addBinaryClauses(z, [-a[i] for i in X])
+			encoder.addBinaryClauses(-z, [-b[j] for j in Y]) # then no selected B line may go through it too
+			encoder.addClause([-z] + [a[i] for i in X]) # z is fully determined by the line variables, so it adds no solutions
+		uncovered = [i for i, line in enumerate(A_lines) if any(p not in point_to_B for p in line)] # only these lines need their disjoint conflicts spelled out
+		for i, partners in incidence.disjointPartners(A_lines, point_to_B, len(B_lines), only=uncovered):
+			encoder.addBinaryClauses(-a[i], [-b[j] for j in partners])
+	else:
+		for i, partners in incidence.conflictPartners(A_lines, B_lines, point_to_B, use_numpy=use_numpy): # worst case ~9604 to ~12544 million clauses twice
+			encoder.addBinaryClauses(-a[i], [-b[j] for j in partners]) # ensure each line selected is incident once to another in the other parallel class
+			if verbose and i % 1000 == 0:
+				print(f"{i}/{len(A_lines)}")
+
+	if verbose and len(symmetries) > 0:
+		print(f"Breaking {len(symmetries)} template symmetries with lex-leader clauses.")
+	for permutation in symmetries: # line permutations from symmetry.refinementSymmetries, over the indices of A_lines + B_lines
+		addLexLeaderClauses(encoder, a + b, permutation)
+	return exhaustive_variables
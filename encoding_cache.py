@@ -0,0 +1,56 @@
+import os
+import sys
+from array import array
+
+# Binary cache for clause blocks that do not depend on the template being searched (e.g. the Latin square and
+# orthogonality core of the alt refinement). A block is stored exactly as ClauseSink keeps it in memory, a flat int32
+# literal buffer with 0 terminating every clause, behind a small header, so loading it is a single read.
+
+CACHE_MAGIC = b"CNFBLOCK"
+CACHE_VERSION = 1
+
+def cache_path(cache_dir, name, **key): # e.g. cache/core-order10-squares3.bin
+	return os.path.join(cache_dir, name + "".join(f"-{k}{v}" for k, v in key.items()) + ".bin")
+
+def store_clauses(path, variableCount, clauseCount, literals):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	header = array('q', [CACHE_VERSION, variableCount, clauseCount, len(literals)])
+	if sys.byteorder != "little": # files are little-endian so a cache can be shared between machines
+		header.byteswap()
+		literals = array('i', literals)
+		literals.byteswap()
+	temp_path = path + ".tmp"
+	with open(temp_path, "wb") as f:
+		f.write(CACHE_MAGIC)
+		header.tofile(f)
+		literals.tofile(f)
+	os.replace(temp_path, path)
+
+def load_clauses(path): # (variableCount, clauseCount, literals) or None when there is no usable cache
+	if not os.path.exists(path):
+		return None
+	with open(path, "rb") as f:
+		if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+			return None
+		header = array('q')
+		header.fromfile(f, 4)
+		if sys.byteorder != "little":
+			header.byteswap()
+		version, variableCount, clauseCount, literal_count = header
+		if version != CACHE_VERSION:
+			return None
+		literals = array('i')
+		literals.fromfile(f, literal_count)
+	if sys.byteorder != "little":
+		literals.byteswap()
+	return variableCount, clauseCount, literals
+
+def cached_clauses(path, build, rebuild=False): # build(encoder) encodes the block into an in-memory Encoder, it only runs when the cache is missing
+	cached = None if rebuild else load_clauses(path)
+	if cached is None:
+		from encoder import Encoder
+		encoder = Encoder(None, buffer_limit=None)
+		build(encoder)
+		cached = (encoder.variableCount, encoder.clauseCount, encoder.sink.literals)
+		store_clauses(path, *cached)
+	return cached
@@ -0,0 +1,168 @@
+try:
+	import numpy
+except ImportError: # the big-integer path below needs nothing outside the standard library
+	numpy = None
+
+# Pair-incidence engine for the refinement encoding. Every candidate line is a set of 10 of the 100 points, so
+# instead of intersecting Python sets pair by pair we keep, for each point, a bitmask over the lines of the other
+# parallel class that contain it. OR-ing 10 of those masks (while tracking which bits were hit twice) gives every
+# line of the other class meeting the current line exactly once, in ~20 big-integer operations per line.
+
+def lineMask(line): # 100-bit mask of a candidate line, bit p-1 is set for point p
+	mask = 0
+	for p in line:
+		mask |= 1 << (int(p) - 1)
+	return mask
+
+def indexMask(indices, n): # n-bit mask with the given line indices set, built through a byte buffer so it stays linear in n
+	buffer = bytearray((n + 7) // 8)
+	for i in indices:
+		buffer[i >> 3] |= 1 << (i & 7)
+	return int.from_bytes(buffer, "little")
+
+def pointMasks(point_to_lines, n): # point_to_A/point_to_B (point -> list of line indices) as point -> n-bit mask
+	return {p: indexMask(indices, n) for p, indices in point_to_lines.items()}
+
+def maskIndices(mask): # indices of the set bits of mask in increasing order
+	bits = bin(mask)[:1:-1] # least significant bit first, "0b" prefix dropped
+	indices = []
+	i = bits.find("1")
+	while i != -1:
+		indices.append(i)
+		i = bits.find("1", i + 1)
+	return indices
+
+def exactlyOneMask(line, point_masks): # lines of the other class meeting line in exactly one point
+	ones = 0 # hit at least once
+	many = 0 # hit at least twice
+	for p in line:
+		m = point_masks.get(p, 0)
+		many |= ones & m
+		ones |= m
+	return ones & ~many
+
+def conflictMasks(lines, point_masks, n): # yields (i, mask of the lines in the other class whose intersection with line i is not exactly 1)
+	full = (1 << n) - 1
+	for i, line in enumerate(lines):
+		yield i, full ^ exactlyOneMask(line, point_masks)
+
+def intersectionCounts(A_lines, B_lines, block=256): # numpy backend, yields (first row, |A_i & B_j| for a block of A rows) using popcount over uint64 words
+	A_words = _maskWords(A_lines)
+	B_words = _maskWords(B_lines)
+	for start in range(0, len(A_lines), block):
+		counts = numpy.zeros((min(block, len(A_lines) - start), len(B_lines)), dtype=numpy.uint8)
+		for w in range(A_words.shape[1]):
+			counts += _popcount(A_words[start:start + block, w, None] & B_words[None, :, w])
+		yield start, counts
+
+def _maskWords(lines): # candidate lines as an (n, 2) uint64 array holding their 100-bit masks
+	words = numpy.zeros((len(lines), 2), dtype=numpy.uint64)
+	for i, line in enumerate(lines):
+		mask = lineMask(line)
+		words[i, 0] = mask & 0xFFFFFFFFFFFFFFFF
+		words[i, 1] = mask >> 64
+	return words
+
+def _popcount(words):
+	if hasattr(numpy, "bitwise_count"): # numpy >= 2.0
+		return numpy.bitwise_count(words).astype(numpy.uint8)
+	table = numpy.array([bin(x).count("1") for x in range(256)], dtype=numpy.uint8)
+	return table[words[..., None].view(numpy.uint8)].sum(axis=-1, dtype=numpy.uint8)
+
+def conflictPartners(A_lines, B_lines, point_to_B, use_numpy=False): # yields (i, sorted indices j with |A_i & B_j| != 1), the pairs needing a "-a[i] -b[j]" clause
+	if use_numpy:
+		if numpy is None:
+			raise ImportError("numpy is required for the vectorized incidence backend.")
+		for start, counts in intersectionCounts(A_lines, B_lines):
+			for row, partners in enumerate(counts != 1):
+				yield start + row, numpy.flatnonzero(partners).tolist()
+	else:
+		point_masks = pointMasks(point_to_B, len(B_lines))
+		for i, mask in conflictMasks(A_lines, point_masks, len(B_lines)):
+			yield i, maskIndices(mask)
+
+# Compressed conflicts. Two lines meeting in two or more points share a pair of points {p, q}, so every such conflict
+# lies in the biclique (A lines through p and q) x (B lines through p and q). One auxiliary variable z per point pair
+# with a[i] -> z for the A side and z -> -b[j] for the B side covers the biclique in |X| + |Y| clauses instead of |X|*|Y|.
+# The remaining conflicts are disjoint pairs, which the exactly-one coverage of each point already rules out whenever
+# every point of the A line lies on some B line: the other B lines then cover its 10 points, so one of them meets it twice.
+
+def pointPairBicliques(A_lines, B_lines): # yields (X, Y), the A and B line indices through each pair of points, for pairs on lines of both classes
+	pairs_A = _pointPairLines(A_lines)
+	pairs_B = _pointPairLines(B_lines)
+	for pair in sorted(pairs_A.keys() & pairs_B.keys()):
+		yield pairs_A[pair], pairs_B[pair]
+
+def _pointPairLines(lines):
+	pairs = {}
+	for i, line in enumerate(lines):
+		points = sorted(line)
+		for x in range(len(points)):
+			for y in range(x + 1, len(points)):
+				pairs.setdefault((points[x], points[y]), []).append(i)
+	return pairs
+
+def disjointPartners(A_lines, point_to_B, n, only=None): # yields (i, sorted indices j with A_i and B_j disjoint), for the A lines in only (default all)
+	point_masks = pointMasks(point_to_B, n)
+	full = (1 << n) - 1
+	for i in range(len(A_lines)) if only is None else only:
+		hit = 0
+		for p in A_lines[i]:
+			hit |= point_masks.get(p, 0)
+		yield i, maskIndices(full ^ hit)
+
+# Arc-consistency pruning before the encoding. A selected A line needs, at each of its points that some B line covers,
+# a B line through that point meeting it nowhere else (the B line covering the point), and at each point it misses
+# that some A line covers, an A line through that point disjoint from it (the A line covering the point), and the same
+# with the classes swapped. Lines without such support are in no refinement, so they are removed, which can take the
+# support away from others, until nothing changes. A point whose class loses every line through it is unsatisfiable.
+
+def pruneLines(A_lines, B_lines): # (kept A indices, kept B indices, [(A removed, B removed) per round], (class, point) emptied or None)
+	point_A = pointMasks(_pointLines(A_lines), len(A_lines))
+	point_B = pointMasks(_pointLines(B_lines), len(B_lines))
+	alive_A = (1 << len(A_lines)) - 1
+	alive_B = (1 << len(B_lines)) - 1
+	rounds = []
+	while True:
+		alive_A, removed_A = _pruneClass(A_lines, alive_A, point_A, point_B, alive_B)
+		alive_B, removed_B = _pruneClass(B_lines, alive_B, point_B, point_A, alive_A)
+		if removed_A == 0 and removed_B == 0:
+			break
+		rounds.append((removed_A, removed_B))
+		emptied = _emptiedPoint(point_A, alive_A, "A") or _emptiedPoint(point_B, alive_B, "B")
+		if emptied is not None:
+			return maskIndices(alive_A), maskIndices(alive_B), rounds, emptied
+	return maskIndices(alive_A), maskIndices(alive_B), rounds, None
+
+def _pointLines(lines):
+	point_to_lines = {}
+	for i, line in enumerate(lines):
+		for p in line:
+			point_to_lines.setdefault(p, []).append(i)
+	return point_to_lines
+
+def _pruneClass(lines, alive, own_masks, other_masks, other_alive): # (alive mask after one sweep over the class, number of lines removed)
+	removed = 0
+	other_current = {p: mask & other_alive for p, mask in other_masks.items()}
+	for i in maskIndices(alive):
+		line = lines[i]
+		once = exactlyOneMask(line, other_current)
+		if any(p in other_current and other_current[p] & once == 0 for p in line): # no partner meeting the line only in p
+			alive &= ~(1 << i)
+			removed += 1
+			continue
+		hit = 0
+		for p in line:
+			hit |= own_masks[p]
+		disjoint = alive & ~hit
+		points = set(line)
+		if any(q not in points and own_masks[q] & disjoint == 0 for q in own_masks): # no line of its own class can cover q alongside it
+			alive &= ~(1 << i)
+			removed += 1
+	return alive, removed
+
+def _emptiedPoint(point_masks, alive, name):
+	for p in sorted(point_masks):
+		if point_masks[p] & alive == 0:
+			return name, p
+	return None
@@ -0,0 +1,76 @@
+import subprocess
+
+from clause_sink import splitClauses
+
+try:
+	from pysat.solvers import Solver
+except ImportError: # only needed for the in-process backend
+	Solver = None
+
+# One long-lived incremental SAT session for a series of queries that share a fixed core. The core is loaded once, and
+# every query's clauses are guarded by a fresh activation literal that is assumed while the query is solved and
+# permanently disabled afterwards, so the learned clauses about the core carry over from one query to the next.
+# Runs in process through PySAT's IPASIR bindings, or writes an iCNF file for a local incremental solver.
+
+class IncrementalSession:
+	def __init__(self, variableCount, core_literals, solver_name="cadical153", icnf_path=None, icnf_solver_path=None):
+		self.variableCount = variableCount
+		self.icnf_path = icnf_path
+		self.icnf_solver_path = icnf_solver_path
+		self.queries = 0
+		if icnf_path is None:
+			if Solver is None:
+				raise ImportError("python-sat is required for an in-process incremental session, use an iCNF file and solver instead.")
+			self.solver = Solver(name=solver_name, bootstrap_with=splitClauses(core_literals))
+		else:
+			self.solver = None
+			self.icnf = open(icnf_path, "w")
+			self.icnf.write("p inccnf\n")
+			self._writeClauses(splitClauses(core_literals))
+
+	def _writeClauses(self, clauses):
+		self.icnf.write("".join(" ".join(map(str, clause)) + " 0\n" for clause in clauses))
+
+	def newActivation(self):
+		self.variableCount += 1
+		return self.variableCount
+
+	def solve(self, literals): # (satisfiable, model) for the core plus one query, or None with an iCNF backend (see results())
+		activation = self.newActivation()
+		guarded = [clause + [-activation] for clause in splitClauses(literals)]
+		self.queries += 1
+		if self.solver is None:
+			self._writeClauses(guarded)
+			self.icnf.write(f"a {activation} 0\n")
+			self._writeClauses([[-activation]]) # retire the query, its guarded clauses become satisfied for good
+			return None
+		for clause in guarded:
+			self.solver.add_clause(clause)
+		satisfiable = self.solver.solve(assumptions=[activation])
+		model = self.solver.get_model() if satisfiable else None
+		self.solver.add_clause([-activation]) # retire the query, its guarded clauses become satisfied for good
+		return satisfiable, model
+
+	def results(self, out_path): # runs the iCNF solver once over every query written so far, yields (satisfiable, model) in query order
+		self.icnf.close()
+		with open(out_path, "w") as out_file:
+			subprocess.run([self.icnf_solver_path, self.icnf_path], stdout=out_file, stderr=subprocess.STDOUT)
+		satisfiable = None
+		model = []
+		with open(out_path, "r") as f:
+			for line in f:
+				if line.startswith("s "):
+					if satisfiable is not None:
+						yield satisfiable, model if satisfiable else None
+					satisfiable = "UNSATISFIABLE" not in line
+					model = []
+				elif line.startswith("v "):
+					model.extend(int(v) for v in line[2:].split() if v != "0")
+		if satisfiable is not None:
+			yield satisfiable, model if satisfiable else None
+
+	def close(self):
+		if self.solver is not None:
+			self.solver.delete()
+		elif not self.icnf.closed:
+			self.icnf.close()
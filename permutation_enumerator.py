@@ -0,0 +1,85 @@
+# In-process enumerator for the candidate lines, the same constraint family the candidate-line encodings hand to
+# cadical-exhaust: permutation matrices restricted to the cells allowed by one frequency-square bit, with an exact
+# number of cells from each template-weight bucket (one weight-4 and nine weight-2 for relational lines, six weight-2
+# and four weight-0 for non-relational ones). A depth-first search places one cell per row, keeps the used columns in
+# a bitmask and the remaining quota of every bucket in a counter, and after each placement checks that every later row
+# still has a free column and that every bucket can still be filled by the rows that are left.
+
+order = 10
+
+LINE_QUOTAS = { # template weight -> number of cells of that weight, for relational (True) and non-relational (False) lines
+	True: {4: 1, 2: 9},
+	False: {2: 6, 0: 4},
+}
+
+def bucketMasks(template, frequency_square, relational_lines): # masks[r][b] = columns of row r allowed in the b-th bucket, and the bucket quotas
+	quotas = LINE_QUOTAS[relational_lines]
+	weights = list(quotas.keys())
+	masks = []
+	for r in range(order):
+		row = [0] * len(weights)
+		for c in range(order):
+			if template[frequency_square][r][c] != (1 if relational_lines == True else 0):
+				continue
+			weight = sum(template[b][r][c] for b in range(len(template)))
+			if weight in quotas: # other weights cannot be used, the quotas already add up to one cell per row
+				row[weights.index(weight)] |= 1 << c
+		masks.append(row)
+	return masks, [quotas[weight] for weight in weights]
+
+def enumeratePermutations(masks, quotas): # yields the column of each row for every permutation meeting the quotas, in lexicographic order
+	rows = len(masks)
+	if sum(quotas) != rows:
+		return
+	row_masks = [0] * rows
+	for r in range(rows):
+		for mask in masks[r]:
+			row_masks[r] |= mask
+	bucket_of = [{c: b for b, mask in enumerate(masks[r]) for c in range(rows) if (mask >> c) & 1} for r in range(rows)]
+	columns = [0] * rows
+	remaining = list(quotas)
+
+	def feasible(r, used): # forward check of the rows after r
+		for b, quota in enumerate(remaining):
+			if quota == 0:
+				continue
+			rows_left = 0
+			for s in range(r + 1, rows):
+				if masks[s][b] & ~used:
+					rows_left += 1
+			if rows_left < quota:
+				return False
+		for s in range(r + 1, rows):
+			if row_masks[s] & ~used == 0:
+				return False
+		return True
+
+	def search(r, used):
+		if r == rows:
+			yield list(columns)
+			return
+		free = row_masks[r] & ~used
+		while free:
+			bit = free & -free
+			free ^= bit
+			c = bit.bit_length() - 1
+			b = bucket_of[r][c]
+			if remaining[b] == 0:
+				continue
+			remaining[b] -= 1
+			columns[r] = c
+			if feasible(r, used | bit):
+				yield from search(r + 1, used | bit)
+			remaining[b] += 1
+
+	yield from search(0, 0)
+
+def candidateLines(template, frequency_square, relational_lines): # yields each candidate line as its points, point = r * order + c + 1 like the solver's variables
+	masks, quotas = bucketMasks(template, frequency_square, relational_lines)
+	for columns in enumeratePermutations(masks, quotas):
+		yield [r * order + c + 1 for r, c in enumerate(columns)]
+
+def compareLines(native_lines, solver_lines): # (lines only the enumerator found, lines only the solver found), both as sorted point tuples
+	native = {tuple(sorted(line)) for line in native_lines}
+	solver = {tuple(sorted(line)) for line in solver_lines}
+	return sorted(native - solver), sorted(solver - native)
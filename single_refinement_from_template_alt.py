@@ -3,7 +3,12 @@ import subprocess
 import sys
 import time
 
-import shutil
+from encoder import Encoder
+from encoding_cache import cache_path, cached_clauses
+from incremental_session import IncrementalSession
+from solver import openSolverPipe
+from symmetry import addLexLeaderClauses, pynauty, rowColumnSymmetries
+from template_store import load_template
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
@@ -14,11 +19,14 @@ output_path = os.path.join(script_dir, "lines.txt")
 satsolver_path = os.path.join(parent_dir, "kissat-rel-4.0.2", "build", "kissat")
 #satsolver_path = os.path.join(parent_dir, "cadical-exhaust-master", "build", "cadical-exhaust")
 
-if len(sys.argv) < 2:
-	print("Usage: python3 generate.py <template_id>\n") 
+arguments = [arg for arg in sys.argv if not arg.startswith("--")]
+batch_mode = "--batch" in sys.argv # solve a range of templates in one incremental session, see runBatch
+if len(arguments) < (3 if batch_mode else 2):
+	print("Usage: python3 generate.py <template_id> [--pipe [--keep-cnf]] [--rebuild-cache] [--no-symmetry]")
+	print("       python3 generate.py <first_template_id> <last_template_id> --batch [--icnf-solver=<path>] [--no-symmetry]\n") 
 	sys.exit(1)
 	
-template_path = os.path.join(script_dir, "templates", str(int(sys.argv[1])+1)+"-template.txt")
+template_id = int(arguments[1]) + 1 # templates are numbered from 1 in templates.bin and templates/<id>-template.txt
 	
 start_time = time.time()
 dimacs_elapsed = 0
@@ -27,188 +35,72 @@ kissat_elapsed = 0
 verify_time = 0
 
 addTemplateClauses = True # Creates clauses to enforce template's relations
-
-clauses = []
-variableCount = 0
-clauseCount = 0
+pipe_to_solver = "--pipe" in sys.argv # stream the formula into the solver's stdin while encoding instead of going through encoding.cnf
+keep_cnf = "--keep-cnf" in sys.argv # with --pipe, still keep a copy of the formula in encoding.cnf for debugging
+rebuild_cache = "--rebuild-cache" in sys.argv # re-encode the template-independent core instead of loading it from cache/
+cache_dir = os.path.join(script_dir, "cache")
+symmetry_breaking = "--no-symmetry" not in sys.argv # lex-leader clauses for the template's row and column automorphisms, see symmetry.py
+icnf_solver_path = None # with --batch, write an iCNF file for this incremental solver instead of solving in process through PySAT
+for arg in sys.argv:
+	if arg.startswith("--icnf-solver="):
+		icnf_solver_path = arg.split("=", 1)[1]
 
 points = [set(), set()]
 candidate_lines = [[[], []], [[], []]] # Relational, Non-relational
 candidate_line_count = [0, 0]
 order = 10
+latin_squares = 3
 
-def prepend_to_file_with_temp(filepath, content_to_prepend):
-	temp_filepath = filepath + ".tmp"
-	with open(temp_filepath, 'w') as temp:
-		temp.write(content_to_prepend)
-		with open(filepath, 'r') as f:
-			shutil.copyfileobj(f, temp, length=1024*1024)  # 1MB buffer
-	os.replace(temp_filepath, filepath) # replaces original file with temporary one
-
-def dumpClauses():
-	global clauses
-	with open(input_path, "a") as f:
-		for line in clauses:
-			f.write(line + "0\n")
-	clauses.clear()
-
-def writeClause(clause):
-	global clauseCount
-	global clauses
-	clauseCount += 1
-	clauses.append(clause)
-	if len(clauses) > 100000:
-		with open(input_path, "a") as f:
-			for line in clauses:
-				f.write(line + "0\n")
-		clauses.clear()
-
-def addClause(variables):
-	if len(variables) == 0: 
-		return False
-	clause = ""
-	for v in variables:
-		clause += str(v) + " "
-	writeClause(clause)
-	return True
-
-def addImplicationClause(antecedent, consequent): # conjunction(AND) of all antecedental variables implies the disjunction(OR) of consequental variables, e.g. "x1 and .. and xn" implies "y1 or ... or yn"
-	clause = "" # X implies Y is equivalent to -X OR Y
-	for x in antecedent:
-		clause += str(-x) + " "
-	for y in consequent:
-		clause += str(y) + " "
-	writeClause(clause)
-	return True
+def get1DIndex(l, r, c, s): # 4n by n^2 matrix
+	index = latin_squares * order * order * r # Split net encoding into n blocks, go the the rth block
+	index += latin_squares * order * c # Split each block into n subblocks, go the cth subblock
+	index += order * l # Skip position data and redundant latin square (e.g. row and column squares)
+	index += s # Pick symbol we're at
+	return index + 1
 
-def addCardinalityClauses(variables, mininum, maximum): # <= maximum variables and >= minimum values are true (latin squares would use minimum = maximum = 1 for each symbol)
-	global variableCount
-	
-	n = len(variables) # rows
-	k = maximum + 1	   # columns
-	l = mininum
-	
-	s = [] # Boolean counter variables, s[i][j] says at least j of the variables x1, ..., xi are assigned to true
-	for i in range(n + 1):
-		row = []
-		for j in range(k + 1):
-			variableCount += 1
-			row.append(variableCount)
-		s.append(row)
-	
-	for i in range(n+1):
-		addClause([s[i][0]]) # 0 variables are always true of variables [x1, ..., xi]
-	for j in range(1, k+1):
-		addClause([-s[0][j]]) # j>=1 of nothing is always false
-	for j in range(1, l+1):
-		addClause([s[n][j]]) # at least minimum of [x0, ..., xi-1] are true
-	for i in range(1, n+1):
-		addClause([-s[i][k]]) # at most maximum of [x0, ..., xi-1] are true
-		
-	for i in range(1, n+1): # for each variable xi, propagate counts across the table
-		for j in range(1, k+1):
-			addImplicationClause([s[i-1][j]], [s[i][j]]) # If at least j of the first i-1 variables are true, then at least j of the first i variables are true
-			addImplicationClause([variables[i-1], s[i-1][j-1]], [s[i][j]]) # If xi is true and at least j-1 of the first i-1 variables are true, then at least j of the first i variables are true
-			if j <= l:
-				addImplicationClause([s[i][j]], [s[i-1][j], variables[i-1]]) # If at least j of the first i variables are true, then either xi is true or at least j of the first i-1 variables were already true
-				addImplicationClause([s[i][j]], [s[i-1][j-1]]) # If at least j of the first i variables are true, then at least j-1 of the first i-1 variables must be true
-
-def getNewVariable():
-	global variableCount
-	variableCount += 1
-	return variableCount
-
-def unloadTemplate(path):
-	template = [[], []]
-	with open(path, "r") as f:
-		for i, line in enumerate(f):
-			line = line.strip()
-			if len(line) > 0:
-				if i <= 9:
-					template[0].append([])
-					for s in list(line):
-						template[0][-1].append(int(s))
-				if i > 10 and i <= 20:
-					template[1].append([])
-					for s in list(line):
-						template[1][-1].append(int(s))
-	return template
+def get4DIndex(index): 
+	index = index - 1
+	r = index // (latin_squares * order * order)
+	index -= r * (latin_squares * order * order)
+	c = index // (latin_squares * order)
+	index -= c * (latin_squares * order)
+	l = index // order
+	index -= l * order
+	return l, r, c, index
 
-if __name__ == "__main__": 
-	def checkValid(square):
-		n = len(square)
-		if any(len(row) != n for row in square): # All rows are length n
-			return False
-		for row in square: # Each row contains all symbols 0 to n-1 exactly once
-			if sorted(row) != list(range(n)):
-				return False
-		for col_idx in range(n): # Each column contains all symbols 0 to n-1 exactly once
-			col = [square[row_idx][col_idx] for row_idx in range(n)]
-			if sorted(col) != list(range(n)):
-				return False
-		return True
-	def checkOrthogonal(squares):
-		square1 = squares[order:order*2] # Q
-		square2 = squares[order*2:order*3] # Z
-		exists = []
-		for i in range(order):
-			for j in range(order):
-				pair = (square1[i][j], square2[i][j])
-				if pair in exists:
-					return False
-				exists.append(pair)
-		return True
-	
-	def get1DIndex(l, r, c, s): # 4n by n^2 matrix
-		index = latin_squares * order * order * r # Split net encoding into n blocks, go the the rth block
-		index += latin_squares * order * c # Split each block into n subblocks, go the cth subblock
-		index += order * l # Skip position data and redundant latin square (e.g. row and column squares)
-		index += s # Pick symbol we're at
-		return index + 1
-	
-	def get4DIndex(index): 
-		index = index - 1
-		r = index // (latin_squares * order * order)
-		index -= r * (latin_squares * order * order)
-		c = index // (latin_squares * order)
-		index -= c * (latin_squares * order)
-		l = index // order
-		index -= l * order
-		return l, r, c, index
-
-	open(input_path, 'w').close()
-
-	template = unloadTemplate(template_path)
-	latin_squares = 3
-	variableCount = get1DIndex(latin_squares - 1, order - 1, order - 1, order - 1) 
-	
-	if addTemplateClauses: # doesnt immedately return UNSAT for templates with 0 refinements
-		for par_class, lines in enumerate(template):
-			for row, line in enumerate(lines):
+def encodeTemplateClauses(encoder, template, verbose=True): # unit and at-most-one clauses tying each cell of P and Q to its template relation
+	for par_class, lines in enumerate(template):
+		for row, line in enumerate(lines):
+			if verbose:
 				print(f"P_{par_class}, Row {row}: {line}")
-				for col, relational in enumerate(line):
-					if relational == 1:
+			for col, relational in enumerate(line):
+				if relational == 1:
+					if verbose:
 						print(f"({row}, {col}) Relational ({relational})")
-						for s in range(4,order):
-							addClause([-get1DIndex(par_class, row, col, s)])
-						allow = []
-						for s in range(4):
-							allow.append(get1DIndex(par_class, row, col, s))
-							for t in range(s+1, 4): # at most one
-								addClause([-get1DIndex(par_class, row, col, s), -get1DIndex(par_class, row, col, t)])
-						addClause(allow) # at least one
-					else:
+					for s in range(4,order):
+						encoder.addClause([-get1DIndex(par_class, row, col, s)])
+					allow = []
+					for s in range(4):
+						allow.append(get1DIndex(par_class, row, col, s))
+						for t in range(s+1, 4): # at most one
+							encoder.addClause([-get1DIndex(par_class, row, col, s), -get1DIndex(par_class, row, col, t)])
+					encoder.addClause(allow) # at least one
+				else:
+					if verbose:
 						print(f"({row}, {col}) Non-Relational ({relational})")
-						for s in range(4):
-							addClause([-get1DIndex(par_class, row, col, s)])
-						allow = []
-						for s in range(4,order):
-							allow.append(get1DIndex(par_class, row, col, s))
-							for t in range(s+1, order): # at most one
-								addClause([-get1DIndex(par_class, row, col, s), -get1DIndex(par_class, row, col, t)])
-						addClause(allow) # at least one 
+					for s in range(4):
+						encoder.addClause([-get1DIndex(par_class, row, col, s)])
+					allow = []
+					for s in range(4,order):
+						allow.append(get1DIndex(par_class, row, col, s))
+						for t in range(s+1, order): # at most one
+							encoder.addClause([-get1DIndex(par_class, row, col, s), -get1DIndex(par_class, row, col, t)])
+					encoder.addClause(allow) # at least one 
+			if verbose:
 				print()
 
+def encodeCoreClauses(encoder): # Latin square and orthogonality clauses, these do not depend on the template and are cached between runs
+	encoder.variableCount = max(encoder.variableCount, get1DIndex(latin_squares - 1, order - 1, order - 1, order - 1))
 	for l in range(latin_squares): # Maintain latin square clauses
 		for x in range(order):
 			for y in range(order): # Create at least one value clause for row, col and symbol
@@ -220,40 +112,163 @@ if __name__ == "__main__":
 					clause2.append(get1DIndex(l, x,z,y))
 					clause3.append(get1DIndex(l, z,x,y))
 					for w in range(z + 1, order): # At most one symbol (binary exclusions)
-						addClause([-get1DIndex(l, x,y,z), -get1DIndex(l, x,y,w)])
-						addClause([-get1DIndex(l, x,z,y), -get1DIndex(l, x,w,y)])
-						addClause([-get1DIndex(l, z,x,y), -get1DIndex(l, w,x,y)])
-				addClause(clause1)
-				addClause(clause2)
-				addClause(clause3)
+						encoder.addClause([-get1DIndex(l, x,y,z), -get1DIndex(l, x,y,w)])
+						encoder.addClause([-get1DIndex(l, x,z,y), -get1DIndex(l, x,w,y)])
+						encoder.addClause([-get1DIndex(l, z,x,y), -get1DIndex(l, w,x,y)])
+				encoder.addClause(clause1)
+				encoder.addClause(clause2)
+				encoder.addClause(clause3)
 	
 	for i in range(order): # orthogonality using auxiliary
 		for i_prime in range(order):
 			for j in range(order):
 				for k in range(order):
 					P, Q, Z = get1DIndex(0, i_prime,j,k), get1DIndex(1, i,j,k), get1DIndex(2, i,j,i_prime)
-					addImplicationClause([Z, P], [Q])
-					addImplicationClause([Z, Q], [P])
-					addImplicationClause([P, Q], [Z])
+					encoder.addImplicationClause([Z, P], [Q])
+					encoder.addImplicationClause([Z, Q], [P])
+					encoder.addImplicationClause([P, Q], [Z])
+
+def cellPermutation(rows, columns): # variable index permutation of P, Q and Z for a row and column automorphism of the template
+	core_variables = get1DIndex(latin_squares - 1, order - 1, order - 1, order - 1)
+	permutation = [0] * core_variables
+	for l in range(latin_squares):
+		for r in range(order):
+			for c in range(order):
+				for s in range(order):
+					image = get1DIndex(l, rows[r], columns[c], rows[s] if l == 2 else s) # the symbols of Z are rows of P
+					permutation[get1DIndex(l, r, c, s) - 1] = image - 1
+	return permutation
+
+def encodeSymmetryBreaking(encoder, template, verbose=True): # only plain row and column permutations that keep both template squares map this encoding onto itself
+	if pynauty is None:
+		if verbose:
+			print("pynauty is not installed, no symmetry breaking.")
+		return
+	symmetries = rowColumnSymmetries(template)
+	if verbose:
+		print(f"Breaking {len(symmetries)} row and column automorphisms of the template with lex-leader clauses.")
+	core_variables = list(range(1, get1DIndex(latin_squares - 1, order - 1, order - 1, order - 1) + 1))
+	for rows, columns in symmetries:
+		addLexLeaderClauses(encoder, core_variables, cellPermutation(rows, columns))
+
+def checkValid(square):
+	n = len(square)
+	if any(len(row) != n for row in square): # All rows are length n
+		return False
+	for row in square: # Each row contains all symbols 0 to n-1 exactly once
+		if sorted(row) != list(range(n)):
+			return False
+	for col_idx in range(n): # Each column contains all symbols 0 to n-1 exactly once
+		col = [square[row_idx][col_idx] for row_idx in range(n)]
+		if sorted(col) != list(range(n)):
+			return False
+	return True
+
+def checkOrthogonal(squares):
+	square1 = squares[order:order*2] # Q
+	square2 = squares[order*2:order*3] # Z
+	exists = []
+	for i in range(order):
+		for j in range(order):
+			pair = (square1[i][j], square2[i][j])
+			if pair in exists:
+				return False
+			exists.append(pair)
+	return True
+
+def decodeModel(values): # P, Q and Z stacked as 3n rows, from the positive literals of a model
+	combinedLatinSquares = [] 
+	for square in range(latin_squares * order):
+		combinedLatinSquares.append([-1] * order) # easily tells us if logic error occured by the existance of -1 symbol
+	core_variables = get1DIndex(latin_squares - 1, order - 1, order - 1, order - 1)
+	for val in values:
+		if 0 < val <= core_variables: # skips activation literals of an incremental session
+			l, r, c, s = get4DIndex(val)
+			combinedLatinSquares[r + l * order][c] = s
+	return combinedLatinSquares
+
+def reportBatchResult(template_id, satisfiable, model, elapsed):
+	if not satisfiable:
+		print(f"Template {template_id}: UNSAT ({elapsed} seconds)")
+		return
+	squares = decodeModel(model)
+	valid = checkValid(squares[0 : order]) and checkValid(squares[order : order*2]) and checkValid(squares[order*2 : order*3]) and checkOrthogonal(squares)
+	print(f"Template {template_id}: SAT, {"valid" if valid else "INVALID"} orthogonal solution ({elapsed} seconds)")
+
+def runBatch(first, last): # solves templates first..last in one incremental session that keeps the core loaded
+	core_path = cache_path(cache_dir, "core", order=order, squares=latin_squares)
+	core_variables, core_clauses, core_literals = cached_clauses(core_path, encodeCoreClauses, rebuild=rebuild_cache)
+	icnf_path = os.path.join(script_dir, "encoding.icnf") if icnf_solver_path is not None else None
+	session = IncrementalSession(core_variables, core_literals, icnf_path=icnf_path, icnf_solver_path=icnf_solver_path)
+	print(f"Loaded core of {core_variables} variables and {core_clauses} clauses into one incremental session.")
+
+	template_ids = list(range(first, last + 1))
+	for template_id in template_ids:
+		template = load_template(template_id + 1)
+		delta = Encoder(None, variableCount=session.variableCount, buffer_limit=None) # auxiliary variables of the query come after the core and earlier activations
+		encodeTemplateClauses(delta, template, verbose=False)
+		if symmetry_breaking:
+			encodeSymmetryBreaking(delta, template, verbose=False)
+		session.variableCount = delta.variableCount
+		query_time = time.time()
+		result = session.solve(delta.sink.literals)
+		if result is not None:
+			reportBatchResult(template_id, *result, round((time.time() - query_time) * 100)/100)
+	if icnf_path is not None:
+		print("Wrote incremental CNF file to:", icnf_path)
+		solve_time = time.time()
+		for template_id, result in zip(template_ids, session.results(output_path)):
+			reportBatchResult(template_id, *result, "-")
+		print("iCNF solver elapsed time:", round((time.time() - solve_time) * 100)/100, "seconds")
+	session.close()
+
+if __name__ == "__main__": 
+	if batch_mode:
+		runBatch(int(arguments[1]), int(arguments[2]))
+		print("\nTotal elapsed time of script:", round((time.time() - start_time) * 100)/100, "seconds")
+		sys.exit(0)
+
+	solver = None
+	if pipe_to_solver:
+		out_file = open(output_path, "w")
+		solver = openSolverPipe(satsolver_path, [], out_file)
+		encoder = Encoder(input_path if keep_cnf else None, stream=solver.stdin)
+	else:
+		encoder = Encoder(input_path)
+
+	template = load_template(template_id)
+	encoder.variableCount = get1DIndex(latin_squares - 1, order - 1, order - 1, order - 1) 
+	
+	if addTemplateClauses: # doesnt immedately return UNSAT for templates with 0 refinements
+		encodeTemplateClauses(encoder, template)
+
+	core_path = cache_path(cache_dir, "core", order=order, squares=latin_squares)
+	core_variables, core_clauses, core_literals = cached_clauses(core_path, encodeCoreClauses, rebuild=rebuild_cache)
+	encoder.addClauses(core_literals, core_clauses)
+	encoder.variableCount = max(encoder.variableCount, core_variables)
 
-	'''
-	Maybe we could encode the the symmetry breaking propositions presented in the Myrvolds Paper? Need to prove we can
-	'''
+	if symmetry_breaking: # the template's own automorphisms, the symbol symmetries of the Latin squares are left alone
+		encodeSymmetryBreaking(encoder, template)
 
-	dumpClauses()
-	print(f"Total of {variableCount} variables and {clauseCount} clauses.")
+	encoder.flush()
+	print(f"Total of {encoder.variableCount} variables and {encoder.clauseCount} clauses.")
 	
 	dimacs_elapsed = round((time.time() - start_time) * 100)/100
 
-	prepend_to_file_with_temp(input_path, f"p cnf {variableCount} {clauseCount}\n") # worse case for clause count is between 9 and 12 billion clauses
+	encoder.close() # patches the reserved header in place, so the body is never copied to prepend it
 			
 	prepend_elapsed = round((time.time() - start_time) * 100)/100 - dimacs_elapsed
 
-	print("Wrote DIMACS CNF file to:", input_path)  
+	if solver is None:
+		print("Wrote DIMACS CNF file to:", input_path)  
 
-	with open(output_path, "w") as out_file:
-		commands = [satsolver_path, input_path]
-		subprocess.run(commands, stdout=out_file, stderr=subprocess.STDOUT)
+		with open(output_path, "w") as out_file:
+			commands = [satsolver_path, input_path]
+			subprocess.run(commands, stdout=out_file, stderr=subprocess.STDOUT)
+	else:
+		print("Streamed DIMACS CNF to:", satsolver_path)
+		solver.wait()
+		out_file.close()
 	verify_time = time.time()
 	print("Wrote output to:", output_path)
 
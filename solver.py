@@ -0,0 +1,46 @@
+import os
+import subprocess
+
+# Launching SAT solvers that read the formula from stdin while it is still being encoded. A streamed formula only knows
+# its final counts once encoding is done, so the solvers are told to accept a header that undercounts the clauses.
+
+LENIENT_HEADER_OPTIONS = { # matched against the solver binary's name
+	"kissat": ["--relaxed"],
+	"cadical": ["--force"],
+}
+
+def lenientHeaderOptions(solver_path):
+	name = os.path.basename(solver_path)
+	for key, options in LENIENT_HEADER_OPTIONS.items():
+		if key in name:
+			return options
+	return []
+
+def openSolverPipe(solver_path, options, out_file): # starts the solver without an input path so it parses DIMACS from stdin, its log goes to out_file
+	commands = [solver_path] + lenientHeaderOptions(solver_path) + options
+	return subprocess.Popen(commands, stdin=subprocess.PIPE, stdout=out_file, stderr=subprocess.STDOUT, text=True, bufsize=1 << 20)
+
+def openSolver(commands): # solver reading its formula from a file, its log is read line by line from process.stdout
+	return subprocess.Popen(commands, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1 << 20)
+
+def streamSolutions(solver, on_solution, solution_cap=None, log_file=None): # parses a cadical-exhaust log from the solver's stdout while it is being written
+	summary = {"solutions": 0, "reported_solutions": None, "process_time": 0, "real_time": 0, "capped": False}
+	for line in solver.stdout:
+		if log_file is not None: # optional full copy of the log, only kept for debugging
+			log_file.write(line)
+		if line.startswith("c New solution:"):
+			summary["solutions"] += 1
+			on_solution(line[16:-2].strip(), summary["solutions"]) # points of the solution with the trailing " 0" dropped, and the running count
+			if solution_cap is not None and summary["solutions"] >= solution_cap:
+				summary["capped"] = True
+				solver.terminate() # the rest of the log, including the timing lines, is never written
+				break
+		elif line.startswith("c Number of solutions:"):
+			summary["reported_solutions"] = int(line[23:-1])
+		elif line.startswith("c total process time since initialization:"):
+			summary["process_time"] = line.split()[6]
+		elif line.startswith("c total real time since initialization:"):
+			summary["real_time"] = line.split()[6]
+	solver.stdout.close()
+	solver.wait()
+	return summary
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import time
+
+# Completion ledger for long template sweeps. Every finished relational/non-relational pass is recorded with its solution
+# count and timings, and a template only counts as done once its candidate-line file has been renamed into place, so
+# an interrupted sweep can be restarted and skips everything that was already completed.
+
+PASS_COLUMNS = ["solutions", "total_elapsed", "dimacs_elapsed", "script_time_sat_elapsed", "process_time_sat_elapsed", "real_time_sat_elapsed"]
+
+class SweepLedger:
+	def __init__(self, path):
+		self.path = path
+		self.connection = sqlite3.connect(path)
+		self.connection.execute("""CREATE TABLE IF NOT EXISTS passes (
+			template_id INTEGER NOT NULL,
+			frequency_square INTEGER NOT NULL,
+			relational INTEGER NOT NULL,
+			status TEXT NOT NULL,
+			solutions INTEGER,
+			total_elapsed REAL,
+			dimacs_elapsed REAL,
+			script_time_sat_elapsed REAL,
+			process_time_sat_elapsed REAL,
+			real_time_sat_elapsed REAL,
+			orbits INTEGER,
+			generators TEXT,
+			error TEXT,
+			finished_at REAL,
+			PRIMARY KEY (template_id, frequency_square, relational))""")
+		self.connection.execute("""CREATE TABLE IF NOT EXISTS templates (
+			template_id INTEGER NOT NULL,
+			frequency_square INTEGER NOT NULL,
+			status TEXT NOT NULL,
+			lines_path TEXT,
+			finished_at REAL,
+			PRIMARY KEY (template_id, frequency_square))""")
+		columns = [row[1] for row in self.connection.execute("PRAGMA table_info(passes)")]
+		if "orbits" not in columns: # ledgers from before --orbits, their passes ran without it
+			self.connection.execute("ALTER TABLE passes ADD COLUMN orbits INTEGER")
+			self.connection.execute("ALTER TABLE passes ADD COLUMN generators TEXT")
+		self.connection.commit()
+
+	def record_pass(self, result, frequency_square): # a pass stopped at a solution cap is stored as 'capped' and not treated as completed
+		values = [float(result[column]) for column in PASS_COLUMNS]
+		values[0] = int(result["solutions"])
+		status = "capped" if result.get("capped") else "done"
+		self.connection.execute(f"INSERT OR REPLACE INTO passes (template_id, frequency_square, relational, status, {", ".join(PASS_COLUMNS)}, orbits, generators, error, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+			[result["template_id"], frequency_square, int(result["relational_lines"]), status] + values + [int(result.get("orbit_mode", False)), result.get("generator_images", ""), time.time()])
+		self.connection.commit()
+
+	def record_failure(self, template_id, frequency_square, relational_lines, error):
+		self.connection.execute("INSERT OR REPLACE INTO passes (template_id, frequency_square, relational, status, error, finished_at) VALUES (?, ?, ?, 'failed', ?, ?)",
+			[template_id, frequency_square, int(relational_lines), str(error), time.time()])
+		self.connection.commit()
+
+	def finish_template(self, template_id, frequency_square, lines_path):
+		self.connection.execute("INSERT OR REPLACE INTO templates (template_id, frequency_square, status, lines_path, finished_at) VALUES (?, ?, 'done', ?, ?)",
+			[template_id, frequency_square, lines_path, time.time()])
+		self.connection.commit()
+
+	def reopen_template(self, template_id, frequency_square): # its lines are incomplete again, e.g. after a capped --redo run
+		self.connection.execute("DELETE FROM templates WHERE template_id = ? AND frequency_square = ?", [template_id, frequency_square])
+		self.connection.commit()
+
+	def completed_templates(self, frequency_square):
+		rows = self.connection.execute("SELECT template_id FROM templates WHERE frequency_square = ? AND status = 'done'", [frequency_square])
+		return {row[0] for row in rows}
+
+	def completed_passes(self, frequency_square): # (template id, relational_lines) -> stored result of every finished pass
+		rows = self.connection.execute(f"SELECT template_id, relational, orbits, generators, {", ".join(PASS_COLUMNS)} FROM passes WHERE frequency_square = ? AND status = 'done'", [frequency_square])
+		passes = {}
+		for row in rows:
+			result = dict(zip(PASS_COLUMNS, row[4:]))
+			result["template_id"] = row[0]
+			result["relational_lines"] = row[1] == 1
+			result["orbit_mode"] = row[2] == 1 # NULL for passes recorded before --orbits existed
+			result["generator_images"] = row[3] or ""
+			passes[(row[0], row[1] == 1)] = result
+		return passes
+
+	def close(self):
+		self.connection.close()
+
+def write_atomically(path, lines): # readers only ever see the old file or the complete new one
+	temp_path = path + ".tmp"
+	with open(temp_path, "w") as f:
+		for line in lines:
+			f.write(line + "\n")
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(temp_path, path)
@@ -0,0 +1,155 @@
+import sys
+
+try:
+	import pynauty
+except ImportError: # symmetry breaking is skipped without it
+	pynauty = None
+
+# Symmetry breaking from the template's automorphism group. template_verification.create_graph already describes a
+# template for nauty, here pynauty.autgrp turns the same graph into generators of its automorphism group: permutations
+# of the rows and columns, possibly transposing the square, swapping the two symbols of a frequency square or the two
+# squares. A generator is only used once it is verified to map the formula onto itself, for the refinement encodings
+# as a permutation of the candidate lines (each class onto itself, or the two classes onto each other), for the alt
+# encoding as a plain row and column permutation that keeps both template squares. Every verified generator then gets
+# lex-leader clauses x <= x o g over the line (or cell) variables, which keep the lexicographically smallest solution of
+# every orbit, so the solver stops exploring branches that are images of each other. Solution counts of an exhaustive
+# search shrink to (at least) one solution per orbit, so cross-checks against older counts need symmetry breaking off.
+# The candidate lines of one frequency square are only stored up to the point permutations that keep every cell's bit
+# and weight (lineSymmetries), as one representative per orbit plus the generators, see candidate_store.py.
+
+order = 10
+ROW_VERTEX = order * order # create_graph's vertex numbering: 100 points, then 10 rows, 10 columns and the 4 symbols
+COLUMN_VERTEX = ROW_VERTEX + order
+SYMBOL_VERTEX = COLUMN_VERTEX + order
+
+def templateAutomorphisms(template): # generators of the automorphism group as vertex images of create_graph's graph, [] without pynauty
+	if pynauty is None:
+		return []
+	from template_decoder import template_to_mask
+	from template_verification import create_graph
+	generators, _, _, _, _ = pynauty.autgrp(create_graph(template_to_mask(template)))
+	return [list(generator) for generator in generators]
+
+def pointPermutation(generator): # point (r * order + c + 1) -> image point, as a list indexed by point
+	images = [0] * (order * order + 1)
+	for v in range(order * order):
+		if generator[v] >= order * order:
+			raise ValueError(f"Generator maps point vertex {v} to vertex {generator[v]}, which is not a point.")
+		images[v + 1] = generator[v] + 1
+	return images
+
+def rowColumnPermutation(generator): # (row images, column images) when the generator neither transposes nor touches the symbols, else None
+	rows = [generator[ROW_VERTEX + r] - ROW_VERTEX for r in range(order)]
+	columns = [generator[COLUMN_VERTEX + c] - COLUMN_VERTEX for c in range(order)]
+	if sorted(rows) != list(range(order)) or sorted(columns) != list(range(order)):
+		return None
+	if any(generator[SYMBOL_VERTEX + s] != SYMBOL_VERTEX + s for s in range(4)):
+		return None
+	return rows, columns
+
+def preservesTemplate(template, rows, columns): # every cell keeps its relation in both squares
+	return all(square[rows[r]][columns[c]] == square[r][c] for square in template for r in range(order) for c in range(order))
+
+def linePermutation(images, A_lines, B_lines): # indices into A_lines + B_lines, or None when the point permutation does not map the line classes onto themselves or onto each other
+	A_index = {tuple(sorted(line)): i for i, line in enumerate(A_lines)}
+	B_index = {tuple(sorted(line)): len(A_lines) + j for j, line in enumerate(B_lines)}
+	for A_target, B_target in [(A_index, B_index), (B_index, A_index)]: # classes kept, classes swapped
+		A_images = _lineImages(images, A_lines, A_target)
+		if A_images is None:
+			continue
+		B_images = _lineImages(images, B_lines, B_target)
+		if B_images is not None:
+			return A_images + B_images
+	return None
+
+def _lineImages(images, lines, index):
+	permutation = []
+	for line in lines:
+		image = index.get(tuple(sorted(images[p] for p in line)))
+		if image is None:
+			return None
+		permutation.append(image)
+	return permutation
+
+def refinementSymmetries(template, A_lines, B_lines): # verified line permutations of the refinement encoding, identity generators dropped
+	permutations = []
+	for generator in templateAutomorphisms(template):
+		permutation = linePermutation(pointPermutation(generator), A_lines, B_lines)
+		if permutation is not None and any(image != i for i, image in enumerate(permutation)):
+			permutations.append(permutation)
+	return permutations
+
+def rowColumnSymmetries(template): # verified (rows, columns) permutations that keep both template squares, for the alt encoding
+	symmetries = []
+	for generator in templateAutomorphisms(template):
+		permutation = rowColumnPermutation(generator)
+		if permutation is not None and preservesTemplate(template, *permutation) and permutation != (list(range(order)), list(range(order))):
+			symmetries.append(permutation)
+	return symmetries
+
+def preservesLines(template, frequency_square, images): # every point keeps its frequency-square bit and template weight, so (non-)relational lines map onto (non-)relational lines
+	for p in range(1, order * order + 1):
+		r, c = divmod(p - 1, order)
+		s, t = divmod(images[p] - 1, order)
+		if template[frequency_square][r][c] != template[frequency_square][s][t]:
+			return False
+		if sum(square[r][c] for square in template) != sum(square[s][t] for square in template):
+			return False
+	return True
+
+def lineSymmetries(template, frequency_square): # verified point permutations of the candidate lines, template is the full trivial + template list like permutation_enumerator's
+	symmetries = []
+	for generator in templateAutomorphisms(template[-2:]):
+		images = pointPermutation(generator)
+		if preservesLines(template, frequency_square, images) and any(images[p] != p for p in range(1, order * order + 1)):
+			symmetries.append(images)
+	return symmetries
+
+def lineOrbit(line, generators): # sorted point tuples of every image of the line under the group the point permutations generate, the line itself first
+	start = tuple(sorted(line))
+	orbit = [start]
+	seen = {start}
+	for current in orbit: # the list grows while it is walked, a breadth-first search
+		for images in generators:
+			image = tuple(sorted(images[p] for p in current))
+			if image not in seen:
+				seen.add(image)
+				orbit.append(image)
+	return orbit
+
+def addLexLeaderClauses(encoder, variables, permutation, limit=None): # variables <=lex their image, (x o g)_i = variables[permutation[i]], over the first limit moved positions
+	support = [i for i in range(len(variables)) if permutation[i] != i]
+	if limit is not None:
+		support = support[:limit] # any prefix of the comparison is still implied by the full lex-leader constraint
+	equal = None # equal <=> the compared prefix of x and x o g is the same, None for the empty prefix (true)
+	for k, i in enumerate(support):
+		x, y = variables[i], variables[permutation[i]]
+		encoder.addClause(([-equal] if equal is not None else []) + [-x, y]) # at the first difference x is false and its image true
+		if k == len(support) - 1:
+			break
+		following = encoder.newVariable() # following <=> equal and x == y, fully determined so no solution is duplicated
+		encoder.addImplicationClause(([equal] if equal is not None else []) + [x, y], [following])
+		encoder.addImplicationClause(([equal] if equal is not None else []), [x, y, following])
+		if equal is not None:
+			encoder.addImplicationClause([following], [equal])
+		encoder.addImplicationClause([following, x], [y])
+		encoder.addImplicationClause([following, y], [x])
+		equal = following
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python3 symmetry.py <template_id>   (lists the automorphism group's generators and which ones are verified row/column permutations)\n")
+		sys.exit(1)
+	if pynauty is None:
+		print("pynauty is not installed.")
+		sys.exit(1)
+	from template_store import load_template
+	template = load_template(int(sys.argv[1]))
+	generators = templateAutomorphisms(template)
+	print(f"Template {sys.argv[1]}: {len(generators)} generators")
+	for generator in generators:
+		permutation = rowColumnPermutation(generator)
+		if permutation is None:
+			print("     transposes or swaps symbols")
+		else:
+			print(f"     rows {permutation[0]}, columns {permutation[1]}, {"keeps" if preservesTemplate(template, *permutation) else "DOES NOT keep"} the template")
@@ -0,0 +1,104 @@
+import json
+import os
+import socket
+import sys
+import time
+
+# Structured run telemetry. Every finished pass of a sweep (and the sweep's start, end and failures) becomes one JSON
+# object per line in a JSONL file, holding all of its phase timers, the solver-reported times, solution, variable and
+# clause counts and the host it ran on, so totals over thousands of templates are a query instead of scraping English
+# sentences. Records are buffered and appended in batches. "summary" prints a table in the template-summary.txt layout
+# from them, but the records only know the candidate-line passes, so it counts lines per template instead of squares.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+def telemetry_path(frequency_square):
+	return os.path.join(script_dir, str(frequency_square) + "-candidate_lines_telemetry.jsonl")
+
+class TelemetryLog:
+	def __init__(self, path, buffer_records=64, flush_interval=10): # written once buffer_records are waiting or flush_interval seconds have passed
+		self.path = path
+		self.host = socket.gethostname()
+		self.buffer = []
+		self.buffer_records = buffer_records
+		self.flush_interval = flush_interval
+		self.last_flush = time.time()
+
+	def record(self, kind, **fields): # kind is "pass", "failure", "sweep_start" or "sweep_end"
+		self.buffer.append({"kind": kind, "time": time.time(), "host": self.host, **fields})
+		if len(self.buffer) >= self.buffer_records or time.time() - self.last_flush >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		self.last_flush = time.time()
+		if len(self.buffer) == 0:
+			return
+		with open(self.path, "a") as f:
+			f.write("".join(json.dumps(record) + "\n" for record in self.buffer))
+		self.buffer = []
+
+	def close(self):
+		self.flush()
+
+def read_records(path, kind=None):
+	records = []
+	with open(path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if len(line) == 0:
+				continue
+			try:
+				record = json.loads(line)
+			except json.JSONDecodeError: # a record cut off by a crash, everything before it is still usable
+				continue
+			if kind is None or record.get("kind") == kind:
+				records.append(record)
+	return records
+
+def pass_time(record): # the solver's own real time, the script's measurement when there is none (e.g. --native passes)
+	return float(record.get("real_time_sat_elapsed") or 0) or float(record.get("script_time_sat_elapsed") or 0)
+
+def summarize(records, first=None, last=None): # template id -> (candidate lines, seconds) from the latest record of each pass
+	latest = {}
+	for record in records:
+		latest[(record["template_id"], record["relational_lines"])] = record
+	if len(latest) == 0:
+		return {}
+	first = min(template_id for template_id, _ in latest) if first is None else first
+	last = max(template_id for template_id, _ in latest) if last is None else last
+	totals = {template_id: [0, 0.0] for template_id in range(first, last + 1)} # templates without records show up as zero rows
+	for (template_id, _), record in latest.items():
+		if template_id in totals:
+			totals[template_id][0] += int(record["solutions"])
+			totals[template_id][1] += pass_time(record)
+	return totals
+
+def format_summary(totals): # template-summary.txt's column layout, with candidate lines where it has squares
+	rows = ["  No.       Lines    Time (s)   Lines/sec"]
+	total_lines, total_time = 0, 0
+	for template_id in sorted(totals):
+		lines, seconds = totals[template_id]
+		seconds = round(seconds)
+		rows.append(f"{template_id:>5}{lines:>12}{seconds:>12}{(lines / seconds if seconds > 0 else 0):>12.1f}")
+		total_lines += lines
+		total_time += seconds
+	rows.append(f"Total{total_lines:>12}{total_time:>12}")
+	return "\n".join(rows) + "\n"
+
+if __name__ == "__main__":
+	arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+	options = {argument.split("=", 1)[0]: argument.split("=", 1)[1] for argument in sys.argv[1:] if argument.startswith("--") and "=" in argument}
+	if len(arguments) < 1 or arguments[0] != "summary":
+		print("Usage: python3 telemetry.py summary [telemetry.jsonl] [--frequency-square=3] [--first=<id>] [--last=<id>] [--output=candidate-lines-summary.txt]\n")
+		sys.exit(1)
+	frequency_square = int(options.get("--frequency-square", 3))
+	path = arguments[1] if len(arguments) > 1 else telemetry_path(frequency_square)
+	records = [record for record in read_records(path, "pass") if record.get("frequency_square", frequency_square) == frequency_square]
+	totals = summarize(records, int(options["--first"]) if "--first" in options else None, int(options["--last"]) if "--last" in options else None)
+	table = format_summary(totals)
+	if "--output" in options:
+		with open(options["--output"], "w") as f:
+			f.write(table)
+		print(f"Wrote summary of {len(totals)} templates to:", options["--output"])
+	else:
+		print(table, end="")
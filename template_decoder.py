@@ -0,0 +1,117 @@
+import operator
+import sys
+import time
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Streaming decoder for the two template sources of template_verification.py. A template (the two 10x10 frequency
+# squares) is a 200-bit int, bit (square * order + row) * order + col, the same bit order as a templates.bin record.
+# A solution_set.txt model is decoded through a lookup table from solver variable to template bit, only looking at its
+# positive literals, instead of testing all 400 positions against the literal list, and a full model in variable order
+# is turned into the bit string of its template with a handful of string operations. templates4444.txt is read in
+# large byte chunks with the whitespace dropped, so every 200 characters are one template (20 rows) and become an int,
+# or with as_array=True a whole chunk becomes (2, 10, 10) uint8 numpy arrays in one call.
+
+order = 10
+squares = 2
+template_bits = squares * order * order
+model_variables = 4 * order * order # the solution sets model all four squares, only squares 2 and 3 form the template
+chunk_size = 1 << 20
+
+def variable_bit(v): # template bit of solver variable v = 4 * order * r + 4 * c + l + 1 (get1DIndex in template_verification.py), None for squares 0 and 1
+	r, rem = divmod(v - 1, 4 * order)
+	c, l = divmod(rem, 4)
+	if l < 2:
+		return None
+	return ((l - 2) * order + c) * order + r # the solution sets store each square transposed
+
+BIT_VALUES = [0] * (model_variables + 1) # variable -> 1 << its template bit, 0 when it is not part of the template
+for v in range(1, model_variables + 1):
+	if variable_bit(v) is not None:
+		BIT_VALUES[v] = 1 << variable_bit(v)
+
+FULL_MODEL_ORDER = sorted((variable_bit(v), v - 1) for v in range(1, model_variables + 1) if variable_bit(v) is not None) # token positions of a full model in template-bit order
+pick_template_tokens = operator.itemgetter(*[position for _, position in FULL_MODEL_ORDER])
+strip_digits = str.maketrans("", "", "0123456789,")
+
+def require_numpy():
+	if numpy is None:
+		raise ImportError("as_array=True needs numpy, decode to bitmasks instead.")
+
+def decode_full_model(tokens): # tokens[v - 1] is the literal of v, as the old create_template assumed for 400 literals
+	marked = "a" + ",a".join(pick_template_tokens(tokens)) # "a-17,a18,..." -> "a-a" -> "01", one character per template bit
+	bits = marked.translate(strip_digits).replace("a-", "0").replace("a", "1")
+	return int(bits[::-1], 2) # bit k is character k
+
+def decode_model(literals): # literals: the text of one model ("1 2 -3 ...") or a list of ints
+	if isinstance(literals, str):
+		literals = literals.split()
+		if len(literals) >= model_variables and literals[model_variables - 1].lstrip("-") == str(model_variables):
+			return decode_full_model(literals)
+		return sum(BIT_VALUES[v] for v in map(int, (literal for literal in literals if literal[0] != "-")) if v <= model_variables)
+	return sum(BIT_VALUES[v] for v in literals if 0 < v <= model_variables)
+
+def read_solution_set(path): # yields the template of every "c New solution: ... 0" line in file order
+	with open(path, "r", buffering=chunk_size) as f:
+		for line in f:
+			if not line.startswith("c New solution:"):
+				continue
+			yield decode_model(line[15:]) # the terminating 0 is not a positive literal
+
+def read_templates4444(path, as_array=False): # yields every template of a templates4444.txt file in file order
+	whitespace = b" \t\r\n"
+	block = template_bits
+	carry = b""
+	with open(path, "rb", buffering=chunk_size) as f:
+		while True:
+			chunk = f.read(chunk_size)
+			if not chunk:
+				break
+			data = carry + chunk.translate(None, whitespace)
+			whole = len(data) - len(data) % block
+			carry = data[whole:]
+			if as_array:
+				require_numpy()
+				grids = (numpy.frombuffer(data[:whole], dtype=numpy.uint8) - ord("0")).reshape(-1, squares, order, order)
+				yield from grids
+			else:
+				for start in range(0, whole, block):
+					yield int(data[start : start + block][::-1], 2) # bit k is character k
+	if len(carry) > 0:
+		raise ValueError(f"{path} ends with {len(carry)} digits that do not make up a whole template.")
+
+def mask_to_template(mask): # template[square][row][col] lists, like template_store.unpack_template
+	return [[[(mask >> ((s * order + r) * order + c)) & 1 for c in range(order)] for r in range(order)] for s in range(squares)]
+
+def template_to_mask(template):
+	mask = 0
+	for s in range(squares):
+		for r in range(order):
+			for c in range(order):
+				if template[s][r][c]:
+					mask |= 1 << ((s * order + r) * order + c)
+	return mask
+
+def cell(mask, s, r, c): # symbol of cell (r, c) of square s
+	return (mask >> ((s * order + r) * order + c)) & 1
+
+def to_record(mask): # templates.bin record bytes
+	return mask.to_bytes((template_bits + 7) // 8, "little")
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python3 template_decoder.py <templates4444.txt | solution_set.txt> [--numpy]   (decodes every template and reports the rate, --numpy only for templates4444.txt)\n")
+		sys.exit(1)
+	as_array = "--numpy" in sys.argv
+	start_time = time.time()
+	with open(sys.argv[1], "r") as f:
+		first = f.readline()
+	if first.startswith("c "):
+		count = sum(1 for _ in read_solution_set(sys.argv[1]))
+	else:
+		count = sum(1 for _ in read_templates4444(sys.argv[1], as_array))
+	elapsed = time.time() - start_time
+	print(f"Decoded {count} templates in {round(elapsed * 100)/100} seconds ({round(count / elapsed) if elapsed > 0 else count} per second)")
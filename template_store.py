@@ -0,0 +1,173 @@
+import mmap
+import os
+import struct
+import sys
+
+# Packed store for all templates in one file, replacing thousands of tiny templates/<id>-template.txt files. After a
+# fixed header every template is one record of squares * order * order bits (25 bytes for two 10x10 frequency squares),
+# record k holds template id k, so its offset is computed directly and reading it needs no index lookup or text parsing.
+# The file is memory-mapped by readers. The text files can still be produced with "python3 template_store.py export".
+
+STORE_MAGIC = b"TMPLSTOR"
+STORE_VERSION = 1
+HEADER_FORMAT = "<8sIIIQ" # magic, version, squares, order, template count
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+default_store_path = os.path.join(script_dir, "templates.bin")
+
+def record_size(squares, order):
+	return (squares * order * order + 7) // 8
+
+def pack_template(template): # grid[square][row][col] of 0/1 -> record bytes, bit (square, row, col) in row-major order
+	squares, order = len(template), len(template[0])
+	value = 0
+	bit = 0
+	for square in template:
+		for row in square:
+			for cell in row:
+				if cell:
+					value |= 1 << bit
+				bit += 1
+	return value.to_bytes(record_size(squares, order), "little")
+
+def unpack_template(record, squares, order):
+	value = int.from_bytes(record, "little")
+	template = []
+	for s in range(squares):
+		template.append([])
+		for r in range(order):
+			offset = (s * order + r) * order
+			row = (value >> offset) & ((1 << order) - 1)
+			template[s].append([(row >> c) & 1 for c in range(order)])
+	return template
+
+class TemplateStore: # read-only, template ids start at 1 like the text files
+	def __init__(self, path=default_store_path):
+		self.path = path
+		self.file = open(path, "rb")
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, self.squares, self.order, self.count = struct.unpack_from(HEADER_FORMAT, self.map, 0)
+		if magic != STORE_MAGIC or version != STORE_VERSION:
+			raise ValueError(f"{path} is not a version {STORE_VERSION} template store.")
+		self.record_size = record_size(self.squares, self.order)
+
+	def __len__(self):
+		return self.count
+
+	def record(self, id):
+		if id < 1 or id > self.count:
+			raise IndexError(f"Template {id} is not in {self.path}, which holds templates 1 to {self.count}.")
+		offset = HEADER_SIZE + (id - 1) * self.record_size
+		return self.map[offset : offset + self.record_size]
+
+	def get(self, id): # template[square][row][col], the same lists the text loaders build
+		return unpack_template(self.record(id), self.squares, self.order)
+
+	def close(self):
+		self.map.close()
+		self.file.close()
+
+class TemplateStoreWriter: # appends templates to a new or existing store, the count in the header is updated on close
+	def __init__(self, path=default_store_path, squares=2, order=10):
+		self.path = path
+		if os.path.exists(path):
+			self.file = open(path, "r+b", buffering=0) # unbuffered, a record is on disk before its certificate is committed
+			magic, version, self.squares, self.order, _ = struct.unpack(HEADER_FORMAT, self.file.read(HEADER_SIZE))
+			if magic != STORE_MAGIC or version != STORE_VERSION:
+				raise ValueError(f"{path} is not a version {STORE_VERSION} template store.")
+			self.truncate((os.path.getsize(path) - HEADER_SIZE) // record_size(self.squares, self.order)) # the header count is stale after an interrupted run, the records are not
+		else:
+			self.file = open(path, "w+b", buffering=0)
+			self.squares, self.order, self.count = squares, order, 0
+			self.file.write(self.header())
+
+	def __len__(self):
+		return self.count
+
+	def header(self):
+		return struct.pack(HEADER_FORMAT, STORE_MAGIC, STORE_VERSION, self.squares, self.order, self.count)
+
+	def truncate(self, count): # keeps templates 1 to count, also drops a partial record left by an interrupted run
+		self.count = count
+		self.file.seek(HEADER_SIZE + count * record_size(self.squares, self.order))
+		self.file.truncate()
+
+	def record(self, id): # reads back an appended template, e.g. to canonicalize it after all
+		if id < 1 or id > self.count:
+			raise IndexError(f"Template {id} is not in {self.path}, which holds templates 1 to {self.count}.")
+		size = record_size(self.squares, self.order)
+		self.file.seek(HEADER_SIZE + (id - 1) * size)
+		record = self.file.read(size)
+		self.file.seek(HEADER_SIZE + self.count * size) # appends continue at the end
+		return record
+
+	def append(self, template, id=None): # returns the id of the stored template
+		return self.append_record(pack_template(template), id)
+
+	def append_record(self, record, id=None): # an already packed template, e.g. a template_decoder.to_record bitmask
+		if id is not None and id != self.count + 1:
+			raise ValueError(f"Template {id} cannot be appended to {self.path}, the next id is {self.count + 1}.")
+		if len(record) != record_size(self.squares, self.order):
+			raise ValueError(f"Template records of {self.path} are {record_size(self.squares, self.order)} bytes, not {len(record)}.")
+		self.file.write(record)
+		self.count += 1
+		return self.count
+
+	def close(self):
+		self.file.seek(0)
+		self.file.write(self.header())
+		self.file.close()
+
+_open_stores = {}
+
+def load_template(template_id, store_path=default_store_path, text_dir=os.path.join(script_dir, "templates")): # from the packed store when there is one, otherwise templates/<id>-template.txt
+	if os.path.exists(store_path):
+		if store_path not in _open_stores: # one memory map per process, sweeps fetch thousands of templates
+			_open_stores[store_path] = TemplateStore(store_path)
+		return _open_stores[store_path].get(template_id)
+	return read_template_file(os.path.join(text_dir, str(template_id) + "-template.txt"))
+
+def read_template_file(path): # text format: one 0/1 row per line, squares separated by blank lines
+	template = [[]]
+	with open(path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if len(line) == 0:
+				continue
+			if len(template[-1]) == len(line):
+				template.append([])
+			template[-1].append([int(x) for x in line])
+	return template
+
+def write_template_file(path, template):
+	with open(path, "w") as f:
+		for frequency_square in template:
+			for row in frequency_square:
+				f.write("".join(str(bit) for bit in row) + "\n")
+			f.write("\n")
+
+if __name__ == "__main__":
+	if len(sys.argv) < 4 or sys.argv[1] not in ["export", "pack"]:
+		print("Usage: python3 template_store.py export <store> <directory>   (writes <directory>/<id>-template.txt)")
+		print("       python3 template_store.py pack <directory> <store>     (packs <directory>/1-template.txt, 2-template.txt, ...)\n")
+		sys.exit(1)
+	if sys.argv[1] == "export":
+		store = TemplateStore(sys.argv[2])
+		os.makedirs(sys.argv[3], exist_ok=True)
+		for id in range(1, len(store) + 1):
+			write_template_file(os.path.join(sys.argv[3], str(id) + "-template.txt"), store.get(id))
+		print(f"Exported {len(store)} templates to {sys.argv[3]}")
+		store.close()
+	else:
+		writer = None
+		id = 1
+		while os.path.exists(os.path.join(sys.argv[2], str(id) + "-template.txt")):
+			template = read_template_file(os.path.join(sys.argv[2], str(id) + "-template.txt"))
+			if writer is None:
+				writer = TemplateStoreWriter(sys.argv[3], len(template), len(template[0]))
+			writer.append(template, id)
+			id += 1
+		if writer is not None:
+			writer.close()
+		print(f"Packed {id - 1} templates into {sys.argv[3]}")
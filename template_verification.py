@@ -1,15 +1,23 @@
+import collections
+import hashlib
+import multiprocessing
 import os
+import sys
 import time
 import pynauty
 
+from certificate_index import CertificateIndex
+from template_decoder import cell, read_solution_set, read_templates4444, to_record
+from template_store import TemplateStoreWriter, default_store_path
+
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 template4444_path = os.path.join(script_dir, "source", "templates4444.txt")
 solution_set_path = os.path.join(script_dir, "source", "solution_set.txt")
+certificate_index_path = os.path.join(script_dir, "certificates.sqlite")
 
 start_time = time.time()
 
-certificates = []
 order = 10
 
 def get1DIndex(l, r, c, s):
@@ -20,43 +28,10 @@ def get1DIndex(l, r, c, s):
         index = -index
     return index
 
-def get4DIndex(v): 
-    v = v - 1 
-    r = v // (4 * order) 
-    rem = v % (4 * order)
-    c = rem // 4
-    rem = rem % 4
-    l = rem
-    return l, r, c 
-
-def create_template(line):
-    template = []
-    for l in range(2): # we only care about the 2 frequency squares (XX**)
-        template.append([])
-        for y in range(order):
-            template[l].append([])
-            for x in range(order):
-                template[l][y].append(-1)
-    for j in range(4 * order * order): # loop over all possible positions, there is not clean way to iterate over only frequency squares 0 and 1 because of how variables are indexed 
-        i = j + 1
-        l, r, c = get4DIndex(i)
-        if l >= 2:
-            s = 0
-            if (len(line) == 400 and line[i-1] > 0) or i in line:
-                s = 1
-            template[l - 2][c][r] = s
-    return template
-
-def generate_file(template): # create a file for each template, this lets us easily access it in the future, we additionally have "templates4444.txt" if we need to find the file with all templates in one 
-    id = len(certificates)
-    template_path = os.path.join(script_dir, "templates", str(id)+"-template.txt")
-    with open(template_path, "w") as f:
-        for frequency_square in template:
-            for row in frequency_square:
-                f.write("".join(str(bit) for bit in row) + "\n")
-            f.write("\n")
-
-def create_graph(grid):
+def generate_file(template, id): # store each template as record <id> of templates.bin, "python3 template_store.py export templates.bin templates" recreates the per-template text files
+    store.append_record(to_record(template), id) # templates are template_decoder bitmasks, already in the record's bit order
+
+def create_graph(grid): # grid is a template_decoder bitmask
     vertex_count = order*order + order*2 + 4 + 4 # 100 points, 10 rows and 10 columns, 4 symbols, 4 "pivot" vertices [R,C,S1,S2]
     
     point_count = order * order - 1
@@ -75,8 +50,8 @@ def create_graph(grid):
 
     for r in range(order):
         for c in range(order):
-            symbol1 = grid[0][r][c] # square 2
-            symbol2 = grid[1][r][c] # square 3
+            symbol1 = cell(grid, 0, r, c) # square 2
+            symbol2 = cell(grid, 1, r, c) # square 3
             id = r * 10 + c # x_{r,c}                               #   0 -  99
             add_vertex(id, point_count + r + 1)                     # 100 - 109
             add_vertex(id, point_count + order + c + 1)             # 110 - 119
@@ -99,55 +74,170 @@ def create_graph(grid):
 
     return pynauty.Graph(vertex_count, False, adjacency_dict, vertex_coloring)
 
-template_count = 0
-with open(template4444_path, "r") as f: # we iterate over the template solutions first so our index order is the same as Gill and Wanless
-    grid = [[],[]]
-    current_square = 0
-    current_row = 0
+ROW_MASKS = [((1 << order) - 1) << (r * order) for r in range(order)] # cells of row r of one square
+COLUMN_MASKS = [sum(1 << (r * order + c) for r in range(order)) for c in range(order)]
+SQUARE_MASK = (1 << (order * order)) - 1
+
+def type_permutations(): # how swapping the two symbols of a square, or the two squares, permutes the cell types 0b(square 2)(square 3)
+    generators = [[2, 3, 0, 1], [1, 0, 3, 2], [0, 2, 1, 3]]
+    permutations = {(0, 1, 2, 3)}
+    while True:
+        grown = permutations | {tuple(p[g[i]] for i in range(4)) for p in permutations for g in generators}
+        if grown == permutations:
+            return sorted(permutations)
+        permutations = grown
+
+TYPE_PERMUTATIONS = type_permutations()
+
+def template_invariant(template): # hash of the cell-type counts of every row and column, unchanged by everything nauty's graph allows
+    a = template & SQUARE_MASK
+    b = template >> (order * order)
+    lines = []
+    for masks in [ROW_MASKS, COLUMN_MASKS]:
+        counts = []
+        for mask in masks:
+            na, nb, nab = (a & mask).bit_count(), (b & mask).bit_count(), (a & b & mask).bit_count()
+            counts.append((order - na - nb + nab, nb - nab, na - nab, nab)) # cells of type 00, 01, 10, 11
+        lines.append(counts)
+    forms = []
+    for p in TYPE_PERMUTATIONS: # symbol swaps and the square swap, then rows and columns may trade places (transpose)
+        rows = sorted(tuple(v[i] for i in p) for v in lines[0])
+        columns = sorted(tuple(v[i] for i in p) for v in lines[1])
+        forms.append(min((rows, columns), (columns, rows)))
+    return hashlib.blake2b(repr(min(forms)).encode(), digest_size=16).digest()
+
+def is_solution_set(path): # solver solution logs start every line with "c New solution:", templates4444.txt is plain 0/1 rows
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) > 0:
+                return not line.isdigit()
+    return False
+
+def batched(templates, size):
+    batch = []
+    for template in templates:
+        batch.append(template)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+def certificate_digest(template):
+    return CertificateIndex.digest(pynauty.certificate(create_graph(template)))
+
+def canonicalize_batch(batch): # runs in the worker processes, returns (digest, digest of the bucket's first template) in batch order, None where nauty is skipped
+    return [(certificate_digest(template) if canonicalize else None, certificate_digest(first) if first is not None else None) for template, invariant, canonicalize, first in batch]
+
+def bucketed(templates, use_invariants): # yields (template, invariant, canonicalize, first), first is the earlier template of its bucket that now needs its certificate too
+    global skipped_certificates
+    seen = set() # invariants met in this run, the merger may not have stored them yet
+    first_templates = {} # invariant -> template, for buckets holding one template of this run without a certificate
+    for template in templates:
+        invariant = template_invariant(template)
+        if not use_invariants:
+            yield template, invariant, True, None
+        elif invariant not in seen:
+            seen.add(invariant)
+            if not certificates.has_invariant(invariant): # nothing seen so far can be isomorphic to it
+                first_templates[invariant] = template
+                skipped_certificates += 1
+                yield template, invariant, False, None
+            elif certificates.undigested_id(invariant) is not None: # the bucket's template from an earlier run, read back from templates.bin
+                yield template, invariant, True, int.from_bytes(store.record(certificates.undigested_id(invariant)), "little")
+            else:
+                yield template, invariant, True, None
+        else:
+            first = first_templates.pop(invariant, None)
+            if first is not None:
+                skipped_certificates -= 1
+            yield template, invariant, True, first
+
+def canonicalized_batches(templates, pool, jobs, batch_size): # yields (batch, digests) in input order, keeping a bounded number of batches in flight
+    if pool is None:
+        for batch in batched(templates, batch_size):
+            yield batch, canonicalize_batch(batch)
+        return
+    window = 4 * jobs
+    in_flight = collections.deque()
+    for batch in batched(templates, batch_size):
+        in_flight.append((batch, pool.apply_async(canonicalize_batch, (batch,))))
+        if len(in_flight) >= window:
+            batch, digests = in_flight.popleft()
+            yield batch, digests.get()
+    while len(in_flight) > 0:
+        batch, digests = in_flight.popleft()
+        yield batch, digests.get()
+
+def process_templates(templates, pool, jobs, batch_size, use_invariants=True): # the merger: walks the canonicalized batches in input order so new ids follow first-seen order
+    template_count = 0
     cert_count = 0
-    for line in f:
-        line = line.strip()
-        line = [(int(x)) for x in list(line)] # Converts line into list of variables
-        if len(line) <= 0:
-            continue
-        grid[current_square].append(line)
-        current_row = current_row + 1
-        if current_square == 1 and current_row == 10:
-            current_square = 0
-            current_row = 0
-            graph = create_graph(grid)
+    for batch, digests in canonicalized_batches(bucketed(templates, use_invariants), pool, jobs, batch_size):
+        for (template, invariant, canonicalize, first), (digest, first_digest) in zip(batch, digests):
             template_count = template_count + 1
-            cert = pynauty.certificate(graph)
-            if cert not in certificates:
-                certificates.append(cert)
-                generate_file(grid)
+            if first_digest is not None:
+                certificates.set_digest(invariant, first_digest) # the first template of the bucket was stored earlier without one
+            if digest is None:
+                id = certificates.add_undigested(invariant)
+            else:
+                id = certificates.add_digest(digest, invariant)
+            if id is not None:
+                generate_file(template, id)
                 cert_count = cert_count + 1
                 if cert_count % 100 == 0:
                     print(f"new certificate, #{cert_count}")
-            grid.clear()
-            grid = [[],[]]
-        elif current_square == 0 and current_row == 10:
-            current_square = 1
-            current_row = 0
-        
-with open(solution_set_path, "r") as f:
-    cert_count = 0
-    line_count = 0
-    for line in f:
-        line_count = line_count + 1
-        line = line.strip()
-        line = line[16:-1] # skip trailing zeros and starting statements
-        line = [(int(x)) for x in line.split()] # Converts line into list of variables
-        template = create_template(line)
-        graph = create_graph(template)
-        cert = pynauty.certificate(graph)
-        template_count = template_count + 1
-        if cert not in certificates:
-            certificates.append(cert)
-            generate_file(template)
-            cert_count = cert_count + 1
-
-print("Total certificate count: " + str(len(certificates)))
-print("Total templates tested: " + str(template_count))
-
-print("Total elapsed time of script:", round((time.time() - start_time) * 100)/100, "seconds")
\ No newline at end of file
+    return template_count
+
+if __name__ == "__main__":
+    rebuild = "--rebuild" in sys.argv # forget the stored certificates and processed inputs, recanonicalize everything
+    use_invariants = "--no-invariants" not in sys.argv # canonicalize every template instead of only those sharing an invariant bucket
+    jobs = os.cpu_count() # canonicalizer processes, --jobs=1 runs everything in this process
+    batch_size = 256 # templates sent to a canonicalizer at once
+    for arg in sys.argv[1:]:
+        if arg.startswith("--jobs="):
+            jobs = int(arg.split("=", 1)[1])
+        elif arg.startswith("--batch-size="):
+            batch_size = int(arg.split("=", 1)[1])
+    input_paths = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(input_paths) == 0:
+        input_paths = [template4444_path, solution_set_path] # templates4444.txt first keeps the Gill and Wanless numbering
+    if rebuild:
+        for path in [certificate_index_path, default_store_path]:
+            if os.path.exists(path):
+                os.remove(path)
+    certificates = CertificateIndex(certificate_index_path)
+    print(f"Loaded {len(certificates)} known certificates from {certificate_index_path}")
+    store = TemplateStoreWriter(default_store_path)
+    if len(store) < len(certificates):
+        print(f"{default_store_path} holds {len(store)} templates but {len(certificates)} certificates are known, run again with --rebuild")
+        sys.exit(1)
+    store.truncate(len(certificates)) # templates written after the last certificate commit of an interrupted run get new ids again
+    filled = certificates.fill_invariants(lambda id: template_invariant(int.from_bytes(store.record(id), "little")))
+    if filled > 0:
+        print(f"Computed the invariants of {filled} templates stored before invariants were kept")
+    skipped_certificates = 0
+
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    template_count = 0
+    for input_path in input_paths:
+        if certificates.has_source(input_path):
+            print(f"Skipping {input_path}, it was already processed")
+            continue
+        if is_solution_set(input_path):
+            tested = process_templates(read_solution_set(input_path), pool, jobs, batch_size, use_invariants)
+        else:
+            tested = process_templates(read_templates4444(input_path), pool, jobs, batch_size, use_invariants)
+        certificates.finish_source(input_path, tested)
+        template_count = template_count + tested
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    print("Total certificate count: " + str(len(certificates)))
+    print("Total templates tested: " + str(template_count))
+    print(f"Nauty calls skipped by the invariant buckets: {skipped_certificates} of {template_count}")
+    certificates.close()
+    store.close()
+
+    print("Total elapsed time of script:", round((time.time() - start_time) * 100)/100, "seconds")
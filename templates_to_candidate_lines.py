@@ -1,93 +1,31 @@
+import argparse
 import os
 import subprocess
-import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import symmetry
+from candidate_store import binary_path, orbit_path, write_candidate_lines, write_orbit_lines
+from cardinality import ENCODINGS
+from encoder import Encoder, encodeCandidateLines
+from permutation_enumerator import candidateLines, compareLines
+from solver import openSolver, openSolverPipe, streamSolutions
+from sweep_ledger import SweepLedger, write_atomically
+from telemetry import TelemetryLog, telemetry_path
+from template_store import load_template
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 
-input_path = os.path.join(script_dir, "encoding.cnf")
-output_path = os.path.join(script_dir, "lines.txt")
+scratch_dir = os.path.join(script_dir, "scratch") # per-job encoding and solver log files, so any number of searches can run side by side
 
 kissat_path = os.path.join(parent_dir, "cadical-exhaust-master", "build", "cadical-exhaust") # Before testing: Update this to your sat solver's location 
 
-frequency_square = 3 
-order = 10
+template_count = 6965
 
-diagnostic_information_path = os.path.join(script_dir, str(frequency_square) + "-candidate_lines_diagnostic_information-2.txt")
 trivial_template_path = os.path.join(script_dir, "source", "trivial_template.txt")
 	
-def addClause(variables):
-	if len(variables) == 0: 
-		return False
-	clause = ""
-	for v in variables:
-		clause += str(v) + " "
-	clauses.append(clause + "0")
-	return True
-
-def addImplicationClause(antecedent, consequent): # conjunction(AND) of all antecedental variables implies the disjunction(OR) of consequental variables, e.g. "x1 and .. and xn" implies "y1 or ... or yn"
-	clause = "" # X implies Y is equivalent to -X OR Y
-	for x in antecedent:
-		clause += str(-x) + " "
-	for y in consequent:
-		clause += str(y) + " "
-	clauses.append(clause + "0")
-	return True
-
-def addCardinalityClauses(variables, mininum, maximum): # <= maximum variables and >= minimum values are true (latin squares would use minimum = maximum = 1 for each symbol)
-	global variableCount
-	
-	n = len(variables) # rows
-	k = maximum + 1	   # columns
-	l = mininum
-	
-	s = [] # Boolean counter variables, s[i][j] says at least j of the variables x1, ..., xi are assigned to true
-	for i in range(n + 1):
-		row = []
-		for j in range(k + 1):
-			variableCount += 1
-			row.append(variableCount)
-		s.append(row)
-	
-	for i in range(n+1):
-		addClause([s[i][0]]) # 0 variables are always true of variables [x1, ..., xi]
-	for j in range(1, k+1):
-		addClause([-s[0][j]]) # j>=1 of nothing is always false
-	for j in range(1, l+1):
-		addClause([s[n][j]]) # at least minimum of [x0, ..., xi-1] are true
-	for i in range(1, n+1):
-		addClause([-s[i][k]]) # at most maximum of [x0, ..., xi-1] are true
-		
-	for i in range(1, n+1): # for each variable xi, propagate counts across the table
-		for j in range(1, k+1):
-			addImplicationClause([s[i-1][j]], [s[i][j]]) # If at least j of the first i-1 variables are true, then at least j of the first i variables are true
-			addImplicationClause([variables[i-1], s[i-1][j-1]], [s[i][j]]) # If xi is true and at least j-1 of the first i-1 variables are true, then at least j of the first i variables are true
-			if j <= l:
-				addImplicationClause([s[i][j]], [s[i-1][j], variables[i-1]]) # If at least j of the first i variables are true, then either xi is true or at least j of the first i-1 variables were already true
-				addImplicationClause([s[i][j]], [s[i-1][j-1]]) # If at least j of the first i variables are true, then at least j-1 of the first i-1 variables must be true
-
-def getCombinations(totalList, array, n, currentRemovals): # n >= 0, generate all possible combinations from n choices
-	if n == 0:
-		totalList.append(currentRemovals)
-	else: 
-		for i in range(len(array)):
-			tmpList = array[i + 1 : len(array)]
-			removals = currentRemovals.copy()
-			removals.append(array[i])
-			getCombinations(totalList, tmpList, n - 1, removals)
-
-def addXORClauses(chain): # create XOR clauses for given chain, should add 2^(len(chain) - 1) clauses for XOR
-	for notCount in range(1, len(chain) + 1, 2):
-		total = []
-		getCombinations(total, list(range(len(chain))), notCount, [])
-		for i in range(len(total)):
-			tmpChain = chain.copy()
-			for j in range(len(total[i])):
-				tmpChain[total[i][j]] = -tmpChain[total[i][j]]
-			addClause(tmpChain)
-
-def load_template_file(file_path):
+def load_template_file(template, file_path):
 	with open(file_path, "r") as f:
 		current_square = len(template)
 		current_line = 0
@@ -104,121 +42,266 @@ def load_template_file(file_path):
 				template[current_square].append(line)
 				current_line += 1
 
-def add_diagnostic_information(string):
-	with open(diagnostic_information_path, "a") as f:
-		f.write(string + "\n")
-
-def get1DIndex(r, c):
-	return r * order + c + 1
-
-def getTemplateBit(r, c, bit):
-	if (r < 0 or r >= order) or (c < 0 or c >= order) or (bit < 0 or bit >= order):
-		raise TypeError(f"Attempted to get bit at ({r},{c},{bit}), which is out of bounds, must be witin {0} and {order} for each position.")
-	return template[bit][r][c]
-
-# loop through each template, output the timings for each search and make a file for their lines
-
-total_time = time.time()
-
-for j in range(6354,6355): # range(6965):
-	add_diagnostic_information(f"# Started candidate line search for {j}-template.txt.")
-	for i in range(2):
-		relational_lines = i % 2 == 0
-
-		add_diagnostic_information(f"- Finding {"" if relational_lines==True else "non-"}relational candidate lines for {j}-template.txt.")
-		
-		start_time = time.time()
-		dimacs_elapsed = 0
-		process_time_sat_elapsed = 0
-		real_time_sat_elapsed = 0
-		script_time_sat_elapsed = 0
-
-		clauses = []
-		variableCount = 0
-
-		template = []
-		load_template_file(trivial_template_path)
-		load_template_file(os.path.join(script_dir, "templates", str(j + 1) + "-template.txt"))
-		candidate_lines_output_path = os.path.join(script_dir, str(frequency_square) + "-candidate_lines", str(j + 1) + "-candidate_lines.txt")
-
-		variableCount = get1DIndex(order-1, order-1) 
-		exhaustive_variables = variableCount
-		for x in range(order): # Make sure variables form a row and column monomial matrix (Permutation matrix)
-			row_vars = [get1DIndex(x, c) for c in range(order)]
-			addCardinalityClauses(row_vars, 1, 1)
-			col_vars = [get1DIndex(r, x) for r in range(order)]
-			addCardinalityClauses(col_vars, 1, 1)
-		
-		num_bits = len(template)
-		weight_buckets = {} # enforce weight 22 for relational and weight 12 for non-relational (with our desired weights for each point in the line)
-		for weight in range(num_bits + 1):
-			weight_buckets[weight] = []
-			
-		for r in range(order): # only include relational or non-relation points
-			for c in range(order):
-				weight = sum(getTemplateBit(r, c, b) for b in range(num_bits))
-				if relational_lines == True:
-					if getTemplateBit(r, c, frequency_square) == 0:
-						addClause([-get1DIndex(r,c)])
-					else:
-						weight_buckets[weight].append(get1DIndex(r, c))
-				elif relational_lines == False:
-					if getTemplateBit(r, c, frequency_square) == 1:
-						addClause([-get1DIndex(r,c)])
-					else:
-						weight_buckets[weight].append(get1DIndex(r, c))
-						
-		if relational_lines == True:
-			addCardinalityClauses(weight_buckets.get(4, []), 1, 1)  # exactly one weight-4
-			addCardinalityClauses(weight_buckets.get(2, []), 9, 9)  # exactly nine weight-2
-		elif relational_lines == False:
-			addCardinalityClauses(weight_buckets.get(2, []), 6, 6)  # exactly six weight-2
-			addCardinalityClauses(weight_buckets.get(0, []), 4, 4)  # exactly four weight-0
-
-		clauseCount = len(clauses)
-		with open(input_path, "w") as f:
-			f.write(f"p cnf {variableCount} {clauseCount}\n")
-			f.write("\n".join(clauses))
-				
-		dimacs_elapsed = round((time.time() - start_time) * 100)/100
-		print("Wrote DIMACS CNF file to:", input_path)  
-
-		kissat_time = time.time()
-		with open(output_path, "w") as out_file:
-			commands = [kissat_path, input_path, "--only-neg", "--order", str(exhaustive_variables)]
-			subprocess.run(commands, stdout=out_file, stderr=subprocess.STDOUT)
+def find_candidate_lines(template_id, frequency_square, relational_lines, pipe_to_solver=False, keep_cnf=False, solution_cap=None, progress_every=0, native=False, cross_check=False, cardinality="sequential", orbits=False): # one solver job, runs in a worker process and only touches its own scratch and pass files
+	start_time = time.time()
+	dimacs_elapsed = 0
+	variables, clauses, cnf_bytes = 0, 0, 0
+
+	job_name = f"{template_id}-{frequency_square}-{"R" if relational_lines==True else "N"}"
+	input_path = os.path.join(scratch_dir, job_name + "-encoding.cnf")
+	output_path = os.path.join(scratch_dir, job_name + "-lines.txt")
+
+	template = []
+	load_template_file(template, trivial_template_path)
+	template.extend(load_template(template_id)) # templates.bin when present, otherwise templates/<id>-template.txt
+	symmetries = symmetry.lineSymmetries(template, frequency_square) if orbits else [] # point permutations of the lines, see symmetry.py
+
+	prefix = f"{"R" if relational_lines==True else "N"} "
+	temp_path = pass_path(frequency_square, template_id, relational_lines) + ".tmp"
+	solver = None
+	log_file = None
+	promoted = False # the temporary pass file only survives once it has been renamed into place
+	pass_file = open(temp_path, "w")
+	try:
+		if orbits: # the "O" line marks a pass of an --orbits run, even one whose template has no symmetries
+			pass_file.write("O orbits\n")
+		for images in symmetries: # "G" lines hold the generators, merge_passes then writes an orbit file
+			pass_file.write("G " + " ".join(map(str, images[1:])) + "\n")
+		orbit_keys = set() # smallest line of every orbit written so far
+		line_count = [0] # lines the written representatives expand to
+		def on_solution(line, count): # each solution goes straight into the pass file, no log is kept and reread
+			if len(symmetries) > 0: # the lex-leader clauses still let a few images of a representative through
+				orbit = symmetry.lineOrbit([int(p) for p in line.split()], symmetries)
+				if min(orbit) in orbit_keys:
+					return
+				orbit_keys.add(min(orbit))
+				line_count[0] += len(orbit)
+			pass_file.write(prefix + line + "\n")
+			if progress_every > 0 and count % progress_every == 0:
+				print(f"{job_name}: {count} solutions so far", flush=True)
+
+		if native: # the in-process enumerator replaces the CNF file and the solver launch
+			kissat_time = time.time()
+			summary = {"solutions": 0, "reported_solutions": None, "process_time": 0, "real_time": 0, "capped": False}
+			for line in candidateLines(template, frequency_square, relational_lines):
+				if solution_cap is not None and summary["solutions"] >= solution_cap:
+					summary["capped"] = True
+					break
+				summary["solutions"] += 1
+				on_solution(" ".join(map(str, line)), summary["solutions"])
+		else:
+			encoder = Encoder(input_path, buffer_limit=None, cardinality=cardinality) # candidate line encodings are small enough to write in one go
+			exhaustive_variables = encodeCandidateLines(encoder, template, frequency_square, relational_lines, symmetries)
+			variables, clauses = encoder.variableCount, encoder.clauseCount
+
+			if pipe_to_solver:
+				dimacs_elapsed = round((time.time() - start_time) * 100)/100
+
+				kissat_time = time.time()
+				solver = openSolverPipe(kissat_path, ["--only-neg", "--order", str(exhaustive_variables)], subprocess.PIPE)
+				encoder.sink.stream = solver.stdin # nothing has been written yet, so the whole formula goes through the pipe
+				if not keep_cnf:
+					encoder.sink.path = None
+				encoder.close() # the solver only prints its banner before the input ends, so nothing blocks on the unread log
+			else:
+				encoder.close()
+					
+				dimacs_elapsed = round((time.time() - start_time) * 100)/100
+
+				kissat_time = time.time()
+				solver = openSolver([kissat_path, input_path, "--only-neg", "--order", str(exhaustive_variables)])
+
+			log_file = open(output_path, "w") if keep_cnf else None # the full solver log is only written for debugging
+			cnf_bytes = encoder.sink.bytes_written
+			summary = streamSolutions(solver, on_solution, solution_cap, log_file)
+
+		pass_file.flush()
+		os.fsync(pass_file.fileno())
+		pass_file.close()
 		script_time_sat_elapsed = round((time.time() - kissat_time) * 100)/100
-		print("Wrote output to:", output_path)
-
-		lines = []
-		timings = []
-
-		with open(output_path, 'r') as f:
-			for line in f:
-				if line.startswith("c Number of solutions:"):
-					solutions = line[23:-1]
-				elif line.startswith("c New solution:"):
-					lines.append(line[16:-2])
-				elif line.startswith("c total process time since initialization:"):
-					process_time_sat_elapsed = line.split()[6]
-				elif line.startswith("c total real time since initialization:"):
-					real_time_sat_elapsed = line.split()[6]
-		
-		with open(candidate_lines_output_path, "a") as f:
-			for line in lines:
-				f.write(f"{"R" if relational_lines==True else "N"} " + line.strip() + "\n")
-				
-		print("Wrote candidate lines to:", candidate_lines_output_path)
-
-		add_diagnostic_information(f"Found {solutions} {"" if relational_lines==True else "non-"}relational candidate lines.")
-
-		add_diagnostic_information(f"Total script elapsed time: {round((time.time() - start_time) * 100)/100} seconds")
-		add_diagnostic_information(f"CNF file creation elapsed time: {dimacs_elapsed} seconds")
-		add_diagnostic_information(f"Script SAT Solver elapsed time: {script_time_sat_elapsed} seconds")
-		add_diagnostic_information(f"SAT Solver reported process time since initialization: {process_time_sat_elapsed} seconds")
-		add_diagnostic_information(f"SAT Solver reported real time since initialization: {real_time_sat_elapsed} seconds")
-	add_diagnostic_information("\n") # double gap
-
-add_diagnostic_information(f"Total time spent finding all templates: {round((time.time() - total_time) * 100)/100} seconds")
+
+		if cross_check and not native and not summary["capped"]: # the solver's lines against the enumerator's, a mismatch fails the pass
+			with open(temp_path, "r") as f:
+				solver_lines = [[int(p) for p in line[2:].split()] for line in f if line.startswith(("R", "N"))]
+			if len(symmetries) > 0:
+				solver_lines = [list(image) for line in solver_lines for image in symmetry.lineOrbit(line, symmetries)]
+			only_native, only_solver = compareLines(candidateLines(template, frequency_square, relational_lines), solver_lines)
+			if only_native or only_solver:
+				raise RuntimeError(f"cross-check failed for {job_name}: {len(only_native)} lines found only by the enumerator, {len(only_solver)} only by the solver")
+		os.replace(temp_path, pass_path(frequency_square, template_id, relational_lines))
+		promoted = True
+	finally: # a failed pass leaves no half-written pass file, solver or scratch formula behind
+		pass_file.close()
+		if solver is not None and solver.poll() is None:
+			solver.terminate()
+			solver.wait()
+		if log_file is not None:
+			log_file.close()
+		if not keep_cnf and os.path.exists(input_path):
+			os.remove(input_path)
+		if not promoted and os.path.exists(temp_path):
+			os.remove(temp_path)
+
+	solutions = summary["solutions"] if summary["reported_solutions"] is None else summary["reported_solutions"]
+	return {
+		"template_id": template_id,
+		"relational_lines": relational_lines,
+		"solutions": line_count[0] if len(symmetries) > 0 else solutions, # lines, not representatives, so counts stay comparable
+		"orbits": len(orbit_keys) if len(symmetries) > 0 else None,
+		"generators": len(symmetries),
+		"orbit_mode": orbits, # both kept in the ledger, a resumed sweep only reuses passes of its own mode
+		"generator_images": format_generators(symmetries),
+		"capped": summary["capped"],
+		"total_elapsed": round((time.time() - start_time) * 100)/100,
+		"dimacs_elapsed": dimacs_elapsed,
+		"script_time_sat_elapsed": script_time_sat_elapsed,
+		"process_time_sat_elapsed": float(summary["process_time"]),
+		"real_time_sat_elapsed": float(summary["real_time"]),
+		"variables": variables,
+		"clauses": clauses,
+		"cnf_bytes": cnf_bytes,
+		"mode": "native" if native else ("pipe" if pipe_to_solver else "file"),
+		"cardinality": cardinality,
+	}
+
+def candidate_lines_path(frequency_square, template_id):
+	return os.path.join(script_dir, str(frequency_square) + "-candidate_lines", str(template_id) + "-candidate_lines.txt")
+
+def pass_path(frequency_square, template_id, relational_lines): # lines of one finished pass, kept until both passes can be merged
+	return candidate_lines_path(frequency_square, template_id) + f".{"R" if relational_lines==True else "N"}.part"
+
+def format_generators(generators): # point images of every generator as stored in the ledger, "" without any
+	return ";".join(" ".join(map(str, images[1:])) for images in generators)
+
+def read_pass(frequency_square, template_id, relational_lines): # (line texts, orbit mode, generators) of one pass file
+	lines, orbit_mode, generators = [], False, []
+	with open(pass_path(frequency_square, template_id, relational_lines), "r") as f:
+		for line in f:
+			if line.startswith("O"):
+				orbit_mode = True
+			elif line.startswith("G"):
+				generators.append([0] + [int(p) for p in line[2:].split()])
+			else:
+				lines.append(line.rstrip("\n"))
+	return lines, orbit_mode, generators
+
+def merge_passes(frequency_square, template_id): # relational lines first, then non-relational, like the files the sequential sweep produced
+	relational_pass = read_pass(frequency_square, template_id, True)
+	non_relational_pass = read_pass(frequency_square, template_id, False)
+	if relational_pass[1:] != non_relational_pass[1:]: # representatives of one pass would be taken as every line, or expanded a second time
+		raise ValueError(f"The passes of template {template_id} ran with different --orbits settings or generators, they are searched again.")
+	lines = relational_pass[0] + non_relational_pass[0]
+	generators = relational_pass[2]
+	path = candidate_lines_path(frequency_square, template_id)
+	relational = [[int(p) for p in line[2:].split()] for line in lines if line.startswith("R")]
+	non_relational = [[int(p) for p in line[2:].split()] for line in lines if line.startswith("N")]
+	if len(generators) > 0: # representatives and generators only, the full files of an earlier run would shadow them
+		for stale_path in [path, binary_path(path)]:
+			if os.path.exists(stale_path):
+				os.remove(stale_path)
+		write_orbit_lines(orbit_path(path), generators, relational, non_relational)
+		path = orbit_path(path)
+	else:
+		if os.path.exists(orbit_path(path)):
+			os.remove(orbit_path(path))
+		write_atomically(path, lines)
+		write_candidate_lines(binary_path(path), relational, non_relational) # the 10-bytes-per-line copy memory-mapped by single_refinement_from_template.py
+	for relational_lines in [True, False]:
+		os.remove(pass_path(frequency_square, template_id, relational_lines))
+	return path
+
+def merge_or_reopen(ledger, telemetry, frequency_square, template_id): # path of the merged file, None when the passes do not fit together and both are marked as failed
+	try:
+		return merge_passes(frequency_square, template_id)
+	except ValueError as error:
+		print(error)
+		for relational_lines in [True, False]:
+			ledger.record_failure(template_id, frequency_square, relational_lines, error)
+			telemetry.record("failure", template_id=template_id, frequency_square=frequency_square, relational_lines=relational_lines, error=str(error))
+		return None
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Find the relational and non-relational candidate lines of a range of templates in parallel.")
+	parser.add_argument("first", type=int, nargs="?", default=1, help="first template id (templates/<id>-template.txt), default 1")
+	parser.add_argument("last", type=int, nargs="?", default=template_count, help=f"last template id, inclusive, default {template_count}")
+	parser.add_argument("--frequency-square", type=int, default=3, help="template bit the lines are drawn from, 2 or 3 (default 3)")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="maximum number of solver jobs running at once (default: all cores)")
+	parser.add_argument("--pipe", action="store_true", help="feed each formula to the solver's stdin instead of writing a CNF file first")
+	parser.add_argument("--keep-cnf", action="store_true", help="keep every job's CNF file and solver log in scratch/")
+	parser.add_argument("--ledger", default=os.path.join(script_dir, "candidate_lines_ledger.sqlite"), help="completion ledger used to resume interrupted sweeps")
+	parser.add_argument("--redo", action="store_true", help="ignore the ledger and search every template in the range again")
+	parser.add_argument("--max-solutions", type=int, default=None, help="stop a pass once it has found this many lines, its template is then searched again by the next run")
+	parser.add_argument("--native", action="store_true", help="enumerate the lines in process with permutation_enumerator.py instead of encoding them for the solver")
+	parser.add_argument("--cross-check", action="store_true", help="run the solver and check its lines against the in-process enumerator, a mismatch fails the pass")
+	parser.add_argument("--cardinality", choices=ENCODINGS + ["auto"], default="sequential", help="encoding of the cardinality constraints, see cardinality.py (default sequential)")
+	parser.add_argument("--orbits", action="store_true", help="only enumerate and store one line per orbit of the template's automorphisms, expanded again when the lines are loaded (needs pynauty)")
+	parser.add_argument("--progress", type=int, default=0, help="print a live solution count every N lines of a pass (default: off)")
+	parser.add_argument("--telemetry", default=None, help="JSONL file receiving one record per pass, default <frequency square>-candidate_lines_telemetry.jsonl, see telemetry.py")
+	args = parser.parse_args()
+
+	frequency_square = args.frequency_square
+	telemetry = TelemetryLog(args.telemetry if args.telemetry is not None else telemetry_path(frequency_square))
+	os.makedirs(scratch_dir, exist_ok=True)
+	os.makedirs(os.path.join(script_dir, str(frequency_square) + "-candidate_lines"), exist_ok=True)
+
+	if args.orbits and symmetry.pynauty is None:
+		print("pynauty is not installed, --orbits stores every line.")
+	ledger = SweepLedger(args.ledger)
+	completed_templates = set() if args.redo else ledger.completed_templates(frequency_square)
+	completed_passes = {} if args.redo else ledger.completed_passes(frequency_square)
+
+	total_time = time.time()
+	finished_passes = {} # template id -> number of passes whose lines are on disk
+
+	with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+		telemetry.record("sweep_start", frequency_square=frequency_square, first=args.first, last=args.last, jobs=args.jobs, pipe=args.pipe, native=args.native, cardinality=args.cardinality, max_solutions=args.max_solutions, orbits=args.orbits)
+		jobs = {}
+		skipped = 0
+		for template_id in range(args.first, args.last + 1): # loop through each template, output the timings for each search and make a file for their lines
+			if template_id in completed_templates:
+				skipped += 2
+				continue
+			for relational_lines in [True, False]:
+				recorded = completed_passes.get((template_id, relational_lines))
+				if recorded is not None and recorded["orbit_mode"] == args.orbits and os.path.exists(pass_path(frequency_square, template_id, relational_lines)): # a pass of the other mode is searched again
+					finished_passes[template_id] = finished_passes.get(template_id, 0) + 1
+					skipped += 1
+					continue
+				job = pool.submit(find_candidate_lines, template_id, frequency_square, relational_lines, args.pipe, args.keep_cnf, args.max_solutions, args.progress, args.native, args.cross_check, args.cardinality, args.orbits)
+				jobs[job] = (template_id, relational_lines)
+			if finished_passes.get(template_id, 0) == 2: # interrupted between finishing both passes and merging them
+				path = merge_or_reopen(ledger, telemetry, frequency_square, template_id)
+				if path is not None:
+					ledger.finish_template(template_id, frequency_square, path)
+		if skipped > 0:
+			print(f"Skipping {skipped} passes already recorded in {args.ledger}.")
+
+		capped_templates = set() # searched up to --max-solutions only, merged but not marked as finished
+		for job in as_completed(jobs): # results are collected as they finish, the workers only write their own pass files
+			template_id, relational_lines = jobs[job]
+			try:
+				result = job.result()
+			except Exception as error:
+				ledger.record_failure(template_id, frequency_square, relational_lines, error)
+				telemetry.record("failure", template_id=template_id, frequency_square=frequency_square, relational_lines=relational_lines, error=str(error))
+				continue
+			telemetry.record("pass", frequency_square=frequency_square, **{key: value for key, value in result.items() if key != "generator_images"}) # the images stay in the ledger
+			ledger.record_pass(result, frequency_square)
+			if result["capped"]:
+				capped_templates.add(template_id)
+			finished_passes[template_id] = finished_passes.get(template_id, 0) + 1
+			if finished_passes[template_id] == 2:
+				path = merge_or_reopen(ledger, telemetry, frequency_square, template_id)
+				if path is None:
+					continue
+				if template_id in capped_templates:
+					ledger.reopen_template(template_id, frequency_square)
+				else:
+					ledger.finish_template(template_id, frequency_square, path)
+				print("Wrote candidate lines to:", path)
+
+		telemetry.record("sweep_end", frequency_square=frequency_square, total_elapsed=round((time.time() - total_time) * 100)/100)
+	telemetry.close()
+	ledger.close()
 
 # cd /mnt/g/Code/sat\ solver\ stuff/refinements\ and\ candidate\ lines